@@ -31,85 +31,383 @@
 # SOFTWARE.
 # -------------------------------------------------------------------------------
 
-import requests
+import argparse
 import time
 import sys 
 import os.path
 from datetime import datetime
 
-from notifications import notification
+from checker import config
+from checker import lock
+from checker import log
+from checker import metrics
+from checker import resolver
+from checker import result_cache
+from checker import schedule
+from checker import scoreboard as provider_scoreboard
+from checker import state
 
 #Global variables
-ipFile = os.path.join(os.path.expanduser("~"), ".config/ip-changed/ip.log")
-timeout = 10
+ipFile = config.IP_FILE
+resolver_mode = os.environ.get('IPCHANGE_RESOLVER', "sequential")
+hedge_delay = float(os.environ.get('IPCHANGE_HEDGE_DELAY', "0"))
+ipv6_enabled = os.environ.get('IPCHANGE_IPV6', "false").lower() == "true"
+ipv6_prefix = int(os.environ.get('IPCHANGE_IPV6_PREFIX', "64"))
+local_precheck = os.environ.get('IPCHANGE_LOCAL_PRECHECK', "false").lower() == "true"
+precheck_max_age = int(os.environ.get('IPCHANGE_PRECHECK_MAX_AGE', "21600"))
+scoreboard = None
+outbox_worker = None
+reuse_results = True
+api_status = None
+checks_run = 0
+lock_wait = float(os.environ.get('IPCHANGE_LOCK_WAIT', "60"))
 
-class Service:
-  url=""
-  def request(self): return requests.get(self.url, timeout = timeout)
+def get_scoreboard():
+  #Loaded once per process: reused across checks in daemon mode
+  global scoreboard
+  if scoreboard is None:
+    scoreboard = provider_scoreboard.Scoreboard(os.path.join(os.path.dirname(ipFile), "scoreboard.json"))
+  return scoreboard
 
-class Icanhazip(Service):
-  name="icanhazip"
-  url="http://ipv4.icanhazip.com/"
-  def ip(self): return self.request().text.strip()
+def resolve_ips():
+  #A resolution of another process a few seconds old is reused (not in daemon mode: a netlink wake needs a fresh one).
+  #Only cron/manual runs share theirs: the daemon does not rewrite resolution.json at every check
+  cache_file = os.path.join(os.path.dirname(ipFile), "resolution.json")
+  if reuse_results:
+    cached = result_cache.load(cache_file, ipv6_enabled)
+    if cached is not None:
+      log.info("- Reusing the address resolved by '{}' less than {:.0f} seconds ago".format(cached[0].service,
+                                                                                           result_cache.ttl),
+               service=cached[0].service, cached=True)
+      return cached
+  #IPv4 and (when enabled) IPv6 are resolved concurrently
+  board = get_scoreboard()
+  try:
+    if not ipv6_enabled:
+      ipv4, ipv6 = resolver.resolve(mode = resolver_mode, hedge_delay = hedge_delay, scoreboard = board), None
+    else:
+      ipv4, ipv6 = resolver.resolve_dual(mode = resolver_mode, hedge_delay = hedge_delay, scoreboard = board)
+  finally:
+    board.save()
+  if reuse_results:
+    result_cache.store(cache_file, ipv4, ipv6, ipv6_enabled)
+  return ipv4, ipv6
 
-class Ipinfo(Service):
-  name="ipinfo"
-  url="http://ipinfo.io/json"
-  def ip(self): return self.request().json()["ip"]
-
-class IpApi(Service):
-  name="ip-api"
-  url="http://ip-api.com/json"
-  def ip(self): return self.request().json()["query"]
+def request_ips():
+  ipv4, ipv6 = resolve_ips()
+  return ipv4.ip, (ipv6.ip if ipv6 else None)
 
 def request_ip():
-  #List of services
-  services = [Icanhazip(), Ipinfo(), IpApi() ]
-  for i in range(len(services)):
-    
-    service = services[i]
-    try:
-      start = time.time()
-      print ("- Requesting current ip with '{}'".format(service.name))
-      ip = service.ip()
-      print ("- Request took {} seconds ".format(int(time.time() - start)))
-      return ip
-    except Exception as error:
-      print ("- Exception when requesting ip using '{}': {} ".format(service.name, error ))
-      
-  error = "Non available services, add more services or increase the timeout (services = {}, timeout = {}) ".format(len(services), timeout)
-  raise RuntimeError(error)
+  return request_ips()[0]
+
+def current_ips():
+  #First line IPv4, optional second line IPv6; None before the first check
+  return state.read(ipFile)
 
 def current_ip():
-  ip = open(ipFile,"r").readlines()[0]
-  return ip.replace('\n', '')
+  return current_ips()[0]
+
+def save_ips(ip, ipv6=None):
+  #Atomic (temp file + rename), skipped when the record is unchanged
+  state.write(ipFile, ip, ipv6)
 
 def save_ip(ip):
-  f = open(ipFile,'w')
-  f.write(str(ip)) 
+  save_ips(ip)
+
+def fingerprint_file():
+  return os.path.join(os.path.dirname(ipFile), "local.fingerprint")
+
+def locally_unchanged():
+  #Public address on a local interface: same interfaces addresses and default routes
+  #as at the last external check means the same public IP
+  from checker import netlink
+  fingerprint = netlink.local_fingerprint()
+  stored, age = netlink.read_fingerprint(fingerprint_file())
+  return fingerprint, fingerprint == stored and age < precheck_max_age
+
+def record_history(old_ip, resolution, family=4):
+  from checker import history
+  store = history.History(os.path.join(os.path.dirname(ipFile), "history.db"))
+  try:
+    store.append(old_ip, resolution.ip, resolution.service, resolution.latency, family)
+  finally:
+    store.close()
+
+def outbox_file():
+  return os.path.join(os.path.dirname(ipFile), "outbox.db")
+
+def queue_notification(old_ip, new_ip, old_ipv6=None, new_ipv6=None):
+  #Imported only on change: the notification stack (keyring, smtplib, backends) is slow to load
+  from notifications import notification
+  from notifications import outbox
+  try:
+    cfg = config.load()
+  except FileNotFoundError:
+    log.warning("Notification will not be sent, there is no config file in {}.".format(config.CONFIG_DIR))
+    return
+  except config.ConfigError as error:
+    log.warning(str(error))
+    return
+  box = outbox.Outbox(outbox_file())
+  try:
+    box.enqueue(notification.channel_names(cfg), old_ip, new_ip, old_ipv6, new_ipv6)
+  finally:
+    box.close()
+
+def deliver_notifications():
+  #Daemon mode: the background worker delivers; cron mode: deliver (or retry) what is due now
+  if outbox_worker is not None:
+    outbox_worker.wake()
+    return
+  if not os.path.exists(outbox_file()):
+    return
+  from notifications import outbox
+  if outbox.has_pending(outbox_file()):
+    outbox.drain(path = outbox_file())
+
+def check():
+  timestamp_format   = "%d-%m-%Y %H:%M:%S"
+  current_timestamp  = datetime.now()
+  current_timestring = datetime.strftime(current_timestamp, timestamp_format)
+
+  stored = current_ips()
+  if stored is not None : #File exists
+    log.info("*** Check at "+current_timestring+" ***")
+    if local_precheck:
+      fingerprint, unchanged = locally_unchanged()
+      if unchanged:
+        log.info("- Local addresses and routes unchanged, IP is still the same: {}".format(stored[0]),
+                 ip=stored[0], service="local")
+        deliver_notifications()
+        return schedule.SAME
+    ipv4, ipv6 = resolve_ips()
+    new_ip, new_ipv6 = ipv4.ip, (ipv6.ip if ipv6 else None)
+    old_ip, old_ipv6 = stored
+    if local_precheck:
+      from checker import netlink
+      netlink.write_fingerprint(fingerprint_file(), fingerprint)
+    #IPv6 is compared on its prefix; a failed IPv6 lookup keeps the stored address
+    ipv6_changed = old_ipv6 is not None and resolver.ipv6_changed(old_ipv6, new_ipv6, ipv6_prefix)
+    ipv6_first = old_ipv6 is None and new_ipv6 is not None
+
+    if new_ip != old_ip or ipv6_changed:
+      #Queued before ip.log is updated: a crash in between detects the change again (deduplicated)
+      queue_notification(old_ip, new_ip, old_ipv6 if ipv6_changed else None, new_ipv6 if ipv6_changed else None)
+      save_ips(new_ip, new_ipv6 or old_ipv6)
+      if new_ip != old_ip:
+        log.info("- IP has changed from "+old_ip+" to "+new_ip, old_ip=old_ip, new_ip=new_ip,
+                 service=ipv4.service, latency=round(ipv4.latency, 3))
+        record_history(old_ip, ipv4)
+      if ipv6_changed:
+        log.info("- IPv6 has changed from "+old_ipv6+" to "+new_ipv6, old_ip=old_ipv6, new_ip=new_ipv6,
+                 service=ipv6.service, latency=round(ipv6.latency, 3), family=6)
+        record_history(old_ipv6, ipv6, 6)
+      outcome = schedule.CHANGED
+    else :
+      if ipv6_first:
+        save_ips(old_ip, new_ipv6)
+        record_history(None, ipv6, 6)
+        log.info("- Storing the IPv6 address: {}".format(new_ipv6), new_ip=new_ipv6, family=6)
+      log.info("- IP is still the same: {}".format(old_ip), ip=old_ip, service=ipv4.service,
+               latency=round(ipv4.latency, 3))
+      outcome = schedule.SAME
+    deliver_notifications()
+    return outcome
+
+  else: 
+    ipv4, ipv6 = resolve_ips()
+    new_ip, new_ipv6 = ipv4.ip, (ipv6.ip if ipv6 else None)
+    save_ips(new_ip, new_ipv6)
+    record_history(None, ipv4)
+    if ipv6:
+      record_history(None, ipv6, 6)
+    if local_precheck:
+      from checker import netlink
+      netlink.write_fingerprint(fingerprint_file(), locally_unchanged()[0])
+    log.info("- This is the first time to run the ip_change script, I will create a file in {} to store your current address: {} ".format(ipFile, new_ip),
+             new_ip=new_ip, service=ipv4.service, latency=round(ipv4.latency, 3))
+    return schedule.NEW
+
+def locked_check():
+  #Single flight: two checks (cron runs, daemon, manual run, containers sharing the folder) never overlap on the
+  #state files; a check started meanwhile waits, then reuses the fresh resolution. None when skipped
+  check_lock = lock.FileLock(os.path.join(os.path.dirname(ipFile), "check.lock"))
+  if not check_lock.acquire(timeout = lock_wait):
+    log.warning("- Previous check still running after {:.0f} seconds, skipped".format(lock_wait))
+    return None
+  global checks_run
+  checks_run += 1
+  started = time.monotonic()
+  outcome = schedule.FAILED
+  #Quiet mode: nothing is logged for an unchanged IP
+  log.begin_check()
+  try:
+    outcome = check()
+    if api_status is not None:
+      publish_status()
+    return outcome
+  finally:
+    check_lock.release()
+    log.end_check(outcome != schedule.SAME)
+    metrics.observe_check(outcome, time.monotonic() - started)
+    if os.path.exists(ipFile):
+      #ip.log is only rewritten on change
+      metrics.last_change.set(os.path.getmtime(ipFile))
+
+def publish_status():
+  #Daemon query API: answered from memory
+  from checker import api
+  stored = current_ips()
+  if stored is not None:
+    api_status.update(*stored, providers = api.provider_health(get_scoreboard()))
+
+def start_api(socket_path, port):
+  global api_status
+  from checker import api
+  stored = current_ips() or (None, None)
+  api_status = api.Status(*stored, last_change = os.path.getmtime(ipFile) if os.path.exists(ipFile) else None)
+  api.start(api_status, socket_path, port)
+  log.info("- Query API listening on {}".format(" and ".join(
+    filter(None, [socket_path, port and "127.0.0.1:{}".format(port)]))), socket=socket_path, port=port)
+
+def scheduled_check(min_interval, max_interval, jitter):
+  #Cron mode with --adaptive: cron starts every min_interval, runs that are not due exit right away
+  plan = schedule.AdaptiveSchedule(min_interval, max_interval, jitter = jitter,
+                                   path = os.path.join(os.path.dirname(ipFile), "schedule.json"))
+  if not plan.due(slack = 30):
+    return
+  try:
+    outcome = locked_check()
+  except Exception:
+    plan.update(schedule.FAILED)
+    raise
+  if outcome is not None:
+    plan.update(outcome)
+
+def reload():
+  from checker import secret_cache
+  config.invalidate()
+  secret_cache.invalidate()
+
+def prewarm_secrets():
+  from checker import secret_cache
+  try:
+    missing = secret_cache.prewarm(config.load())
+  except (FileNotFoundError, config.ConfigError) as error:
+    log.warning("- Secrets not pre-warmed: {}".format(error))
+    return
+  for service in missing:
+    log.warning("- Secret '{}' not found, try running initial configuration again!".format(service))
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Send a notification in case of public IP change")
+  parser.add_argument("--daemon", action="store_true",
+                      help="keep running and check on a schedule instead of checking once (cron mode)")
+  parser.add_argument("--interval", type=int, default=int(os.environ.get('IPCHANGE_CHECK', "60")),
+                      help="minutes between two checks in daemon mode (default: $IPCHANGE_CHECK or 60)")
+  parser.add_argument("--jitter", type=int, default=int(os.environ.get('IPCHANGE_JITTER', "30")),
+                      help="maximum random seconds added to each interval in daemon mode (default: 30)")
+  parser.add_argument("--adaptive", action="store_true",
+                      default=os.environ.get('IPCHANGE_ADAPTIVE', "false").lower() == "true",
+                      help="poll every --min-interval minutes after a change or a failure, backing off up to "
+                           "--interval while the IP is stable")
+  parser.add_argument("--min-interval", type=float, default=schedule.min_interval,
+                      help="adaptive mode shortest interval in minutes (default: $IPCHANGE_MIN_INTERVAL or 2)")
+  parser.add_argument("--log-file", default=log.log_file,
+                      help="write the log to this file, rotated by size and age (default: $IPCHANGE_LOG_FILE or stdout)")
+  parser.add_argument("--log-format", choices=log.FORMATS, default=log.log_format,
+                      help="plain text or one JSON object per line (default: $IPCHANGE_LOG_FORMAT or text)")
+  parser.add_argument("--log-level", choices=log.LEVELS, default=log.log_level,
+                      help="minimum level of the logged messages (default: $IPCHANGE_LOG_LEVEL or info)")
+  parser.add_argument("--quiet", action="store_true", default=log.quiet,
+                      help="log nothing for the checks finding the same IP (warnings and errors excepted)")
+  parser.add_argument("--api-socket", default=os.environ.get('IPCHANGE_API_SOCKET'),
+                      help="daemon mode: serve the current IP, last change and IP services health on this "
+                           "Unix socket")
+  parser.add_argument("--api-port", type=int, default=int(os.environ.get('IPCHANGE_API_PORT', "0")),
+                      help="daemon mode: also serve the query API on this localhost port (default: 0, disabled)")
+  parser.add_argument("--metrics-port", type=int, default=int(os.environ.get('IPCHANGE_METRICS_PORT', "0")),
+                      help="daemon mode: serve Prometheus metrics on this local port (default: 0, disabled)")
+  parser.add_argument("--metrics-file", default=os.environ.get('IPCHANGE_METRICS_FILE'),
+                      help="write Prometheus metrics to this file after the check (textfile collector)")
+  parser.add_argument("--resolver", choices=resolver.MODES, default=resolver_mode,
+                      help="try the IP services one after another or race them concurrently (default: sequential)")
+  parser.add_argument("--hedge-delay", type=float, default=hedge_delay,
+                      help="seconds to wait for an answer before starting the next service in race mode "
+                           "(default: 0, start all at once)")
+  parser.add_argument("--prewarm-secrets", action="store_true",
+                      default=os.environ.get('IPCHANGE_PREWARM_SECRETS', "false").lower() == "true",
+                      help="read the notification secrets from the keyring at daemon startup")
+  parser.add_argument("--ipv6", action="store_true", default=ipv6_enabled,
+                      help="also check the IPv6 address/prefix, concurrently with the IPv4 one")
+  parser.add_argument("--local-precheck", action="store_true", default=local_precheck,
+                      help="skip the external IP services while the local addresses and default routes are unchanged "
+                           "(hosts holding the public address on an interface)")
+  parser.add_argument("--netlink", action="store_true",
+                      default=os.environ.get('IPCHANGE_NETLINK', "false").lower() == "true",
+                      help="daemon mode: check immediately on Linux address/route changes")
+  parser.add_argument("--fleet", nargs="?", const="", default=None, metavar="TARGETS",
+                      help="check every target of a targets.json file (default: next to config.json) "
+                           "instead of this host")
+  parser.add_argument("--concurrency", type=int, default=None,
+                      help="maximum concurrent target checks in fleet mode (default: $IPCHANGE_FLEET_CONCURRENCY or 50)")
+  return parser.parse_args()
 
 #Main
-timestamp_format   = "%d-%m-%Y %H:%M:%S"
-hour_minute_format = "%H:%M"
-current_timestamp  = datetime.now()
-current_timestring = datetime.strftime(current_timestamp, timestamp_format)
-
-if os.path.isfile(ipFile) : #File exists
-  print("*** Check at "+current_timestring+" ***")
-  new_ip = request_ip()  
-  old_ip = current_ip()
-
-  if new_ip != old_ip:
-    save_ip(new_ip)
-    print ("- IP has changed from "+old_ip+" to "+new_ip)
-    notification.sent_notification(old_ip, new_ip)
-  else :
-    print ("- IP is still the same: {}".format(old_ip))
-
-else: 
-  new_ip = request_ip()
-  save_ip(new_ip)
-  print ("- This is the first time to run the ip_change script, I will create a file in {} to store your current address: {} ".format(ipFile, new_ip))
+if __name__ == '__main__':
+  args = parse_args()
+  log.setup(args.log_file, args.log_format, args.log_level, args.quiet)
+  resolver_mode = args.resolver
+  hedge_delay = args.hedge_delay
+  ipv6_enabled = args.ipv6
+  local_precheck = args.local_precheck
+  if args.fleet is not None:
+    from checker import fleet
+    if args.daemon:
+      sys.stdout.reconfigure(line_buffering=True)
+    fleet.run_fleet(args.fleet or fleet.TARGETS_FILE, args.concurrency, args.interval * 60 if args.daemon else None)
+  elif args.daemon:
+    from checker import daemon
+    sys.stdout.reconfigure(line_buffering=True)
+    if args.adaptive:
+      log.info("*** Starting daemon, checking every {} to {} minutes ***".format(args.min_interval, args.interval))
+    else:
+      log.info("*** Starting daemon, checking every {} minutes ***".format(args.interval))
+    if args.prewarm_secrets:
+      prewarm_secrets()
+    from notifications import outbox
+    outbox_worker = outbox.OutboxWorker(path = outbox_file()).start()
+    reuse_results = False
+    plan = None
+    if args.adaptive:
+      plan = schedule.AdaptiveSchedule(args.min_interval * 60, args.interval * 60, jitter = args.jitter)
+    runner = daemon.Daemon(locked_check, args.interval * 60, args.jitter, on_reload = reload, schedule = plan)
+    runner.install_signal_handlers()
+    if args.api_socket or args.api_port:
+      start_api(args.api_socket, args.api_port)
+    if args.metrics_port:
+      metrics.serve(args.metrics_port)
+      log.info("- Serving metrics on port {}".format(args.metrics_port), port=args.metrics_port)
+    if args.netlink:
+      from checker import netlink
+      def on_events(events):
+        log.info("- Network change detected ({}), checking now".format(", ".join(events)), events=events)
+        runner.wake()
+      netlink.NetlinkWatcher(on_events).start()
+    runner.run()
+  else:
+    try:
+      if args.adaptive:
+        scheduled_check(args.min_interval * 60, args.interval * 60, args.jitter)
+      else:
+        locked_check()
+    except Exception as error:
+      log.error("- Check failed: {}".format(error), exc_info=True, error=str(error))
+      sys.exit(1)
+    finally:
+      #Runs that did not check (not due, lock wait timed out) keep the previous file and its timestamps
+      if args.metrics_file and checks_run:
+        metrics.write_textfile(args.metrics_file)
 
 # --------------
 # EndOfFile
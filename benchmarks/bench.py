@@ -0,0 +1,299 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Benchmark of the check and notification paths against local stand-in
+# services (benchmarks/stubs.py), with configurable latency, error rates and
+# blackholed providers. Reports p50/p95/p99 latencies plus CPU time and RSS
+# per check, and can save/compare JSON results between commits:
+#
+#   python3 benchmarks/bench.py --checks 200 --latency ipinfo=0.2 --blackhole icanhazip \
+#       --mode race --hedge-delay 0.3 --json after.json --compare before.json
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import stubs
+
+SERVICES = ("opendns", "icanhazip", "ipinfo", "ip-api", "stun")
+CHANNELS = ("ifttt", "pushbullet", "smtp")
+
+
+def name_value(text):
+    name, _, value = text.partition("=")
+    return name, float(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark IP checks and notifications against local stubs")
+    parser.add_argument("--checks", type=int, default=100, help="number of checks to run (default: 100)")
+    parser.add_argument("--notifications", type=int, default=20, help="number of notifications to send (default: 20)")
+    parser.add_argument("--notification-type", choices=("", "pushbullet", "ifttt"), default="ifttt",
+                        help="additional notification channel besides mail (default: ifttt)")
+    parser.add_argument("--mode", default="sequential", help="resolver mode (default: sequential)")
+    parser.add_argument("--hedge-delay", type=float, default=0.0, help="race mode hedge delay (sec)")
+    parser.add_argument("--stun", action="store_true",
+                        help="add the STUN stub to the IP services, ranked by the scoreboard like the others")
+    parser.add_argument("--timeout", type=float, default=2.0, help="IP services timeout (sec, default: 2)")
+    parser.add_argument("--latency", type=name_value, action="append", default=[], metavar="NAME=SEC",
+                        help="latency of a stub ({})".format(", ".join(SERVICES + CHANNELS)))
+    parser.add_argument("--jitter", type=name_value, action="append", default=[], metavar="NAME=SEC",
+                        help="random extra latency of a stub")
+    parser.add_argument("--error-rate", type=name_value, action="append", default=[], metavar="NAME=RATE",
+                        help="fraction of failing requests of a stub")
+    parser.add_argument("--blackhole", action="append", default=[], metavar="NAME",
+                        help="stub that never answers")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="compare the results with a previous --json file")
+    return parser.parse_args()
+
+
+def behaviours(args):
+    result = {name: stubs.Behaviour() for name in SERVICES + CHANNELS}
+    for name, value in args.latency:
+        result[name].latency = value
+    for name, value in args.jitter:
+        result[name].jitter = value
+    for name, value in args.error_rate:
+        result[name].error_rate = value
+    for name in args.blackhole:
+        result[name].blackhole = True
+    return result
+
+
+def memory_keyring(passwords):
+    import keyring
+    import keyring.backend
+
+    class MemoryKeyring(keyring.backend.KeyringBackend):
+        priority = 1
+
+        def get_password(self, service, username):
+            return passwords.get((service, username))
+
+        def set_password(self, service, username, password):
+            passwords[(service, username)] = password
+
+        def delete_password(self, service, username):
+            passwords.pop((service, username), None)
+
+    keyring.set_keyring(MemoryKeyring())
+
+
+def load_ip_check():
+    spec = importlib.util.spec_from_file_location("ip_check", os.path.join(ROOT, "IP-check.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def setup(args, config_dir):
+    # The configuration folder is read at import time
+    os.environ['IPCHANGE_CONFIG_DIR'] = config_dir
+
+    from checker import config
+    from checker import services
+    from checker import udp_services
+    from notifications import ifttt_notification
+    from notifications import pushbullet_notification as pushbullet
+
+    stub_behaviours = behaviours(args)
+    http = stubs.StubHTTPServer(behaviours=stub_behaviours).start()
+    smtp = stubs.SMTPSink(behaviour=stub_behaviours["smtp"]).start()
+
+    services.timeout = args.timeout
+    dns = stubs.StubDNSServer(ip=http.ip, behaviour=stub_behaviours["opendns"]).start()
+    stun = stubs.StubSTUNServer(ip=http.ip).start()
+    # The STUN client is not a built-in provider: one probe checks it end to end
+    # before the stub gets its behaviour. It only joins the checks with --stun,
+    # where the scoreboard makes it the primary service as the cheapest one
+    probe = udp_services.STUNService("stun", *stun.server_address).ip()
+    if probe != http.ip:
+        raise RuntimeError("STUN probe answered {}, expected {}".format(probe, http.ip))
+    stun.behaviour = stub_behaviours["stun"]
+    stun.hits = 0
+
+    # Built-in providers pointed at the stubs, same paths and query strings
+    for entry in services.PROVIDERS:
+        if entry.get("family", 4) != 4:
+            continue
+        if entry.get("type") == "dns":
+            entry.update(server=dns.server_address[0], port=dns.server_address[1])
+        else:
+            entry["url"] = http.base_url + "/" + entry["name"] + "/" + entry["url"].split("/", 3)[3]
+    if args.stun:
+        services.PROVIDERS.append({"name": "stun", "type": "stun", "server": stun.server_address[0],
+                                   "port": stun.server_address[1]})
+    ifttt_notification.IFTTT_URL = http.base_url + "/ifttt/trigger/{}/with/key/{}"
+    pushbullet.PUSHES_URL = http.base_url + "/pushbullet/v2/pushes"
+    pushbullet.DEVICES_URL = http.base_url + "/pushbullet/v2/devices"
+
+    memory_keyring({("Mail-OutageDetector", "bench@example.com"): "password",
+                    ("PushBullet-OutageDetector", "pushbullet"): "o.benchkey",
+                    ("IFTTT-OutageDetector", "bench_event"): "benchkey"})
+    config.save({"notification_type": args.notification_type, "sender": "bench@example.com",
+                 "receivers": "one@example.com,two@example.com", "smtp_server": "127.0.0.1",
+                 "port": smtp.server_address[1], "smtp_ssl": False,
+                 "smtp_allow_plaintext": True, "house_address": "Benchmark",
+                 "ifttt_event": "bench_event"})
+
+    ip_check = load_ip_check()
+    ip_check.resolver_mode = args.mode
+    ip_check.hedge_delay = args.hedge_delay
+    # Every check resolves: the shared result cache would answer all but the first one
+    ip_check.reuse_results = False
+    with open(ip_check.ipFile, "w") as ip_file:
+        ip_file.write(http.ip)
+    return ip_check, http, smtp, dns, stun
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": ordered[-1],
+            "mean": statistics.mean(ordered)}
+
+
+def measure(function, count):
+    latencies = []
+    cpu = []
+    failures = 0
+    for _ in range(count):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                function()
+        except Exception:
+            failures += 1
+        cpu.append(time.process_time() - cpu_start)
+        latencies.append(time.perf_counter() - wall_start)
+    return latencies, cpu, failures
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as config_dir:
+        ip_check, http, smtp, dns, stun = setup(args, config_dir)
+        from notifications import notification
+
+        rss_start = rss_kb()
+        check_latencies, check_cpu, check_failures = measure(ip_check.check, args.checks)
+        rss_checks = rss_kb()
+
+        def notify():
+            report = notification.sent_notification("203.0.113.9", http.ip)
+            if not report or not all(result.ok for result in report):
+                raise RuntimeError("notification failed")
+
+        notify_latencies, notify_cpu, notify_failures = measure(notify, args.notifications)
+
+        results = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+            "check": dict(percentiles(check_latencies), failures=check_failures,
+                          cpu_ms=1000 * statistics.mean(check_cpu) if check_cpu else 0),
+            "notification": dict(percentiles(notify_latencies), failures=notify_failures,
+                                 cpu_ms=1000 * statistics.mean(notify_cpu) if notify_cpu else 0),
+            "rss_kb": {"start": rss_start, "after_checks": rss_checks, "end": rss_kb(),
+                       "peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss},
+            "requests": dict(http.hits, opendns=dns.hits, stun=stun.hits, smtp_connections=smtp.connections,
+                             smtp_messages=smtp.messages),
+        }
+        dns.stop()
+        stun.stop()
+        http.stop()
+        smtp.stop()
+    return results
+
+
+def print_results(results, baseline=None):
+    for section in ("check", "notification"):
+        values = results[section]
+        line = "- {:<12} ".format(section)
+        for key in ("p50", "p95", "p99", "max"):
+            if key in values:
+                line += " {} {:8.1f} ms".format(key, values[key] * 1000)
+                if baseline and key in baseline.get(section, {}):
+                    line += " ({:+.1f})".format((values[key] - baseline[section][key]) * 1000)
+        line += "  cpu {:.2f} ms/op  failures {}".format(values["cpu_ms"], values["failures"])
+        print(line)
+    rss = results["rss_kb"]
+    print("- rss          start {} kB, after checks {} kB, end {} kB, peak {} kB".format(
+        rss["start"], rss["after_checks"], rss["end"], rss["peak"]))
+    print("- requests     {}".format(", ".join("{}={}".format(key, value)
+                                               for key, value in sorted(results["requests"].items()))))
+
+
+def main():
+    args = parse_args()
+    results = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as json_file:
+            baseline = json.load(json_file)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
+
+
+# --------------
+# EndOfFile
+# --------------
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Startup benchmark: measures the import cost of an IP-check.py run that finds
+# the IP unchanged, using `python -X importtime`, and fails when the notification
+# stack is imported eagerly again or the startup exceeds the given budget.
+#
+#   python3 benchmarks/startup.py --runs 5 --max-ms 400
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "IP-check.py")
+
+# Modules that must only be loaded once an IP change has been detected
+LAZY_MODULES = ("keyring", "keyrings", "pushbullet", "magic", "smtplib", "notifications")
+
+
+def parse_importtime(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), self_us, cumulative_us, depth))
+    return imports
+
+
+def run_once():
+    # --help stops right after the module level imports, before any network I/O
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", SCRIPT, "--help"],
+                            capture_output=True, text=True, cwd=ROOT)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError("IP-check.py failed to start: {}".format(result.stderr.strip()[-500:]))
+    return wall, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure IP-check.py startup import time")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs (default: 5)")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest top-level imports to show")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when the median import time exceeds it")
+    args = parser.parse_args()
+
+    walls = []
+    totals = []
+    imports = []
+    for _ in range(args.runs):
+        wall, imports = run_once()
+        walls.append(wall * 1000)
+        totals.append(sum(self_us for _, self_us, _, _ in imports) / 1000)
+
+    print("- Startup wall time: median {:.1f} ms, min {:.1f} ms ({} runs)".format(
+        statistics.median(walls), min(walls), args.runs))
+    print("- Import time: median {:.1f} ms, {} modules".format(statistics.median(totals), len(imports)))
+    top_level = sorted((entry for entry in imports if entry[3] == 0), key=lambda entry: -entry[2])
+    for name, _, cumulative_us, _ in top_level[:args.top]:
+        print("  {:>8.1f} ms  {}".format(cumulative_us / 1000, name))
+
+    failed = False
+    eager = sorted({name for name, _, _, _ in imports if name.split(".")[0] in LAZY_MODULES})
+    if eager:
+        print("- FAIL: modules imported at startup that should be lazy: {}".format(", ".join(eager)))
+        failed = True
+    if args.max_ms is not None and statistics.median(totals) > args.max_ms:
+        print("- FAIL: median import time above {} ms".format(args.max_ms))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
+
+
+# --------------
+# EndOfFile
+# --------------
@@ -0,0 +1,336 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Local stand-ins for the IP services and the notification backends, used by
+# the benchmarks: icanhazip (plain text), ipinfo.io/json, ip-api.com/json,
+# IFTTT webhooks, the Pushbullet API, an SMTP sink, and the UDP services: a
+# DNS server answering every A/AAAA/TXT query with the stub address and a STUN
+# server. Every endpoint has a configurable Behaviour (latency, jitter, error
+# rate, blackhole).
+
+import ipaddress
+import json
+import random
+import socketserver
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class Behaviour:
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, blackhole=False, error_status=500):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.blackhole = blackhole
+        self.error_status = error_status
+
+    # Returns False when the request must be left unanswered
+    def apply(self, stopped):
+        if self.blackhole:
+            stopped.wait(3600)
+            return False
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def failing(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+# Fake payloads shaped like the real ones, geolocation fields included
+def ipinfo_payload(ip):
+    return {"ip": ip, "hostname": "host-{}.example.net".format(ip.replace(".", "-")), "city": "Rome",
+            "region": "Lazio", "country": "IT", "loc": "41.8919,12.5113", "org": "AS0000 Example Telecom",
+            "postal": "00100", "timezone": "Europe/Rome", "readme": "https://ipinfo.io/missingauth"}
+
+
+def ip_api_payload(ip, fields=None):
+    payload = {"status": "success", "country": "Italy", "countryCode": "IT", "region": "62", "regionName": "Lazio",
+            "city": "Rome", "zip": "00100", "lat": 41.8919, "lon": 12.5113, "timezone": "Europe/Rome",
+            "isp": "Example Telecom", "org": "Example Telecom", "as": "AS0000 Example Telecom", "query": ip}
+    if fields:
+        payload = {key: value for key, value in payload.items() if key in fields.split(",")}
+    return payload
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body in one segment, without Nagle: no delayed-ACK stalls
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, content_type="application/json"):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self):
+        path, query = urlsplit(self.path)[2:4]
+        fields = parse_qs(query).get("fields", [None])[0]
+        if path.startswith("/icanhazip"):
+            return "icanhazip", lambda: (200, self.server.ip + "\n", "text/plain")
+        if path.startswith("/ipinfo") and path.endswith("/ip"):
+            return "ipinfo", lambda: (200, self.server.ip + "\n", "text/plain")
+        if path.startswith("/ipinfo"):
+            return "ipinfo", lambda: (200, ipinfo_payload(self.server.ip), "application/json")
+        if path.startswith("/ip-api"):
+            return "ip-api", lambda: (200, ip_api_payload(self.server.ip, fields), "application/json")
+        if path.startswith("/ifttt/trigger/"):
+            return "ifttt", lambda: (200, "Congratulations! You've fired the event", "text/plain")
+        if path.startswith("/pushbullet/"):
+            return "pushbullet", lambda: (200, self.pushbullet(path), "application/json")
+        return None, None
+
+    def pushbullet(self, path):
+        if path.endswith("/users/me"):
+            return {"iden": "ujstub", "name": "Stub", "email": "stub@example.com", "active": True}
+        if path.endswith("/devices"):
+            return {"devices": []}
+        if path.endswith("/chats"):
+            return {"chats": []}
+        if path.endswith("/channels"):
+            return {"channels": []}
+        if path.endswith("/pushes"):
+            return {"iden": "pushstub", "type": "note", "active": True}
+        return {}
+
+    def handle_request(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        name, answer = self.route()
+        if name is None:
+            return self.reply(404, {"error": "not found"})
+        behaviour = self.server.behaviours.get(name, Behaviour())
+        with self.server.lock:
+            self.server.hits[name] = self.server.hits.get(name, 0) + 1
+        if not behaviour.apply(self.server.stopped):
+            self.close_connection = True
+            return
+        if behaviour.failing():
+            return self.reply(behaviour.error_status, {"error": "stub failure"})
+        self.reply(*answer())
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, ip="203.0.113.10", behaviours=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), StubHandler)
+        self.ip = ip
+        self.behaviours = behaviours or {}
+        self.hits = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    @property
+    def base_url(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+
+# Minimal SMTP server accepting any login and any message
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def write(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        behaviour = self.server.behaviour
+        with self.server.lock:
+            self.server.connections += 1
+        if not behaviour.apply(self.server.stopped):
+            return
+        self.write("220 smtp-sink ESMTP")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    if behaviour.failing():
+                        self.write("451 stub failure")
+                        continue
+                    with self.server.lock:
+                        self.server.messages += 1
+                    self.write("250 OK queued")
+                continue
+            command = line.split(" ")[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.write("250-smtp-sink")
+                self.write("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.write("235 Authentication successful")
+            elif command == "DATA":
+                in_data = True
+                self.write("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self.write("221 Bye")
+                return
+            else:
+                self.write("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, behaviour=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.behaviour = behaviour or Behaviour()
+        self.connections = 0
+        self.messages = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+
+class UDPStubHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        data, sock = self.request
+        behaviour = self.server.behaviour
+        with self.server.lock:
+            self.server.hits += 1
+        if not behaviour.apply(self.server.stopped):
+            return
+        answer = self.answer(data, behaviour.failing())
+        if answer is not None:
+            sock.sendto(answer, self.client_address)
+
+
+class DNSHandler(UDPStubHandler):
+
+    def answer(self, query, failing):
+        ident = struct.unpack(">H", query[:2])[0]
+        end = query.index(b"\0", 12) + 5
+        question = query[12:end]
+        record_type = struct.unpack(">H", question[-4:-2])[0]
+        address = ipaddress.ip_address(self.server.ip6 if record_type == 28 else self.server.ip)
+        if failing:
+            return struct.pack(">HHHHHH", ident, 0x8182, 1, 0, 0, 0) + question
+        if record_type == 16:
+            text = str(address).encode()
+            rdata = bytes([len(text)]) + text
+        else:
+            rdata = address.packed
+        # Answer name: pointer to the question name
+        record = struct.pack(">HHHIH", 0xC00C, record_type, 1, 60, len(rdata)) + rdata
+        return struct.pack(">HHHHHH", ident, 0x8180, 1, 1, 0, 0) + question + record
+
+
+class STUNHandler(UDPStubHandler):
+
+    def answer(self, request, failing):
+        if failing or len(request) < 20:
+            return None
+        cookie, transaction = request[4:8], request[8:20]
+        address = ipaddress.ip_address(self.server.ip)
+        key = cookie if address.version == 4 else cookie + transaction
+        port = struct.pack(">H", self.client_address[1] ^ 0x2112)
+        xored = bytes(byte ^ mask for byte, mask in zip(address.packed, key))
+        value = struct.pack(">BB", 0, 1 if address.version == 4 else 2) + port + xored
+        attribute = struct.pack(">HH", 0x0020, len(value)) + value
+        return struct.pack(">HH", 0x0101, len(attribute)) + cookie + transaction + attribute
+
+
+class StubUDPServer(socketserver.ThreadingUDPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    handler = None
+
+    def __init__(self, ip="203.0.113.10", ip6="2001:db8::10", behaviour=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), self.handler)
+        self.ip = ip
+        self.ip6 = ip6
+        self.behaviour = behaviour or Behaviour()
+        self.hits = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+
+class StubDNSServer(StubUDPServer):
+    handler = DNSHandler
+
+
+class StubSTUNServer(StubUDPServer):
+    handler = STUNHandler
+
+
+# --------------
+# EndOfFile
+# --------------
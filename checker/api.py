@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+# Local query API of the daemon: the last known address, the last change time
+# and the IP services health, answered from memory so local tools (VPN config
+# generators, firewall scripts) do not query the IP services themselves.
+# HTTP/1.1 over a Unix domain socket and/or a localhost TCP port:
+#
+#   GET /ip                          the IPv4 address, plain text
+#   GET /status                      JSON: ip, ipv6, last_change, last_check, version, providers
+#   GET /wait?version=N&timeout=S    long-poll: answers /status as soon as the
+#                                    version (bumped on every change) is not N,
+#                                    or after S seconds (at most max_wait)
+#
+#   curl --unix-socket ~/.config/ip-changed/api.sock http://localhost/status
+
+import json
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+max_wait = 300
+
+
+class Status:
+
+    def __init__(self, ip=None, ipv6=None, last_change=None):
+        self.changed = threading.Condition()
+        self.fields = {"ip": ip, "ipv6": ipv6, "last_change": last_change, "last_check": None, "version": 0,
+                       "providers": {}}
+        self.encode()
+
+    # Answers are encoded once per update, requests only copy bytes
+    def encode(self):
+        self.ip_body = (self.fields["ip"] or "").encode() + b"\n"
+        self.status_body = json.dumps(self.fields).encode()
+
+    def update(self, ip, ipv6=None, providers=None, now=None):
+        now = now or time.time()
+        with self.changed:
+            if (ip, ipv6) != (self.fields["ip"], self.fields["ipv6"]):
+                self.fields.update(ip=ip, ipv6=ipv6, last_change=now, version=self.fields["version"] + 1)
+                self.changed.notify_all()
+            self.fields["last_check"] = now
+            if providers is not None:
+                self.fields["providers"] = providers
+            self.encode()
+
+    def wait(self, version, timeout):
+        with self.changed:
+            self.changed.wait_for(lambda: self.fields["version"] != version, timeout)
+            return self.status_body
+
+
+def provider_health(board):
+    return {name: {"state": board.state(name), "latency": entry["latency"], "success_rate": entry["success_rate"],
+                   "failures": entry["failures"]}
+            for name, entry in list(board.stats.items())}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, body, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        status = self.server.status
+        path, query = urlsplit(self.path)[2:4]
+        if path == "/ip":
+            return self.reply(status.ip_body, "text/plain")
+        if path == "/status":
+            return self.reply(status.status_body)
+        if path == "/wait":
+            params = parse_qs(query)
+            try:
+                version = int(params.get("version", ["-1"])[0])
+                timeout = min(float(params.get("timeout", [str(max_wait)])[0]), max_wait)
+            except ValueError:
+                return self.send_error(400, "version and timeout must be numbers")
+            return self.reply(status.wait(version, timeout))
+        self.send_error(404)
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def start(status, socket_path=None, port=0, address="127.0.0.1"):
+    servers = []
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        servers.append(UnixHTTPServer(socket_path, Handler))
+    if port:
+        tcp = ThreadingHTTPServer((address, port), Handler)
+        tcp.daemon_threads = True
+        servers.append(tcp)
+    for server in servers:
+        server.status = status
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return servers
+
+
+# --------------
+# EndOfFile
+# --------------
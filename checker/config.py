@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+
+
+CONFIG_DIR  = os.environ.get('IPCHANGE_CONFIG_DIR', os.path.join(os.path.expanduser("~"), ".config/ip-changed"))
+CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+IP_FILE     = os.path.join(CONFIG_DIR, "ip.log")
+
+NOTIFICATION_TYPES = ("", "none", "pushbullet", "ifttt")
+REQUIRED_FIELDS    = ("sender", "receivers", "smtp_server", "house_address")
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Config:
+    path: str
+    notification_type: str
+    sender: str
+    receivers: str
+    smtp_server: str
+    house_address: str
+    port: int = 465
+    ifttt_event: str = None
+    # Whole config.json content, for the optional settings
+    raw: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def config_dir(self):
+        return os.path.dirname(self.path)
+
+    @property
+    def receiver_list(self):
+        return self.receivers.split(',')
+
+    def get(self, key, default=None):
+        return self.raw.get(key, default)
+
+
+def parse(data, path=CONFIG_FILE):
+    if not isinstance(data, dict):
+        raise ConfigError("Config.json file is not a JSON object, try running the initial configuration again!")
+    notification_type = data.get("notification_type", "") or ""
+    if notification_type not in NOTIFICATION_TYPES:
+        raise ConfigError("Config.json file has an unknown notification_type '{}' (expected one of: {})".format(
+            notification_type, ", ".join(repr(value) for value in NOTIFICATION_TYPES)))
+    missing = [key for key in REQUIRED_FIELDS if not data.get(key)]
+    if notification_type == "ifttt" and not data.get("ifttt_event"):
+        missing.append("ifttt_event")
+    if missing:
+        raise ConfigError("Config.json file doesn't have all fields ({}), try running the initial configuration "
+                          "again!".format(", ".join(missing)))
+    try:
+        port = int(data.get("port") or 465)
+    except ValueError:
+        raise ConfigError("Config.json file has an invalid port '{}'".format(data.get("port")))
+
+    return Config(path=path,
+                  notification_type=notification_type,
+                  sender=data["sender"],
+                  receivers=data["receivers"],
+                  smtp_server=data["smtp_server"],
+                  house_address=data["house_address"],
+                  port=port,
+                  ifttt_event=data.get("ifttt_event"),
+                  raw=data)
+
+
+# Parsed configurations cached per path, reloaded only when the file mtime changes
+_cache = {}
+_lock = threading.Lock()
+
+
+def load(path=CONFIG_FILE):
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path) as json_file:
+        try:
+            data = json.load(json_file)
+        except ValueError as error:
+            raise ConfigError("Config.json file is not valid JSON: {}".format(error))
+    config = parse(data, path)
+    with _lock:
+        _cache[path] = (mtime, config)
+    return config
+
+
+def invalidate(path=None):
+    with _lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(path, None)
+
+
+def save(data, path=CONFIG_FILE):
+    config = parse(data, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w+') as json_file:
+        json.dump(data, json_file)
+    invalidate(path)
+    return config
+
+
+# --------------
+# EndOfFile
+# --------------
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+import random
+import signal
+import threading
+import time
+
+from checker import log
+
+# Runs the check job in-process every `interval` seconds (plus random jitter),
+# so imports and connection state survive between checks.
+# SIGTERM/SIGINT stop the loop once the running check completes, SIGHUP calls
+# the reload hook and triggers an immediate check; wake() (e.g. from a netlink
+# watcher) triggers an immediate check.
+# With an adaptive `schedule` (checker.schedule) the delay follows the outcome
+# returned by the job instead of the fixed interval.
+class Daemon:
+
+    def __init__(self, job, interval, jitter=0, on_reload=None, schedule=None):
+        self.job = job
+        self.interval = interval
+        self.jitter = jitter
+        self.on_reload = on_reload
+        self.schedule = schedule
+        self.outcome = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._reload = False
+
+    def stop(self, signum=None, frame=None):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self, *args):
+        self._wake.set()
+
+    def reload(self, signum=None, frame=None):
+        self._reload = True
+        self._wake.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+
+    def next_delay(self, elapsed):
+        if self.schedule is not None:
+            return max(0, self.schedule.update(self.outcome) - elapsed)
+        delay = max(0, self.interval - elapsed)
+        if self.jitter > 0:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+    def run_once(self):
+        started = time.monotonic()
+        try:
+            self.outcome = self.job()
+        except Exception as error:
+            log.error("- Check failed: {}".format(error), error=str(error))
+            self.outcome = "failed"
+        return time.monotonic() - started
+
+    def run(self):
+        while not self._stop.is_set():
+            elapsed = self.run_once()
+            self._wake.wait(self.next_delay(elapsed))
+            self._wake.clear()
+            if self._reload and not self._stop.is_set():
+                self._reload = False
+                log.info("- Reload requested")
+                if self.on_reload is not None:
+                    self.on_reload()
+        log.info("- Daemon stopped")
+
+
+# --------------
+# EndOfFile
+# --------------
@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Fleet mode: checks many sites ("targets") from one process on an asyncio
+# event loop, at most `concurrency` checks in flight. Targets are listed in
+# targets.json (next to config.json), each one with its own state file, address
+# label and notification routing (any config.json field can be overridden):
+#
+#   [{"name": "rome", "house_address": "Rome office", "hostname": "rome.dyndns.example"},
+#    {"name": "milan", "url": "http://10.8.0.2/ip", "notification_type": "ifttt", "ifttt_event": "milan"},
+#    {"name": "turin", "proxy": "http://10.8.0.3:3128", "receivers": "turin@example.com"}]
+#
+# A target IP is read from its dynamic DNS `hostname`, from a site `url`
+# answering with the address (plain text, or JSON with `key`), or through the
+# usual IP services using the site HTTP `proxy`.
+
+import asyncio
+import ipaddress
+import json
+import os
+import re
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from checker import config
+from checker import history
+from checker import log
+from checker import resolver
+from checker import services
+from checker import state
+
+
+TARGETS_FILE = os.path.join(config.CONFIG_DIR, "targets.json")
+STATE_DIR    = os.path.join(config.CONFIG_DIR, "fleet")
+
+default_concurrency = int(os.environ.get('IPCHANGE_FLEET_CONCURRENCY', "50"))
+
+
+@dataclass
+class Target:
+    name: str
+    cfg: config.Config
+    state_file: str
+    hostname: str = None
+    url: str = None
+    key: str = None
+    proxy: str = None
+    interval: float = None
+    next_check: float = field(default=0.0, compare=False)
+
+
+def load_targets(path=TARGETS_FILE, base=None):
+    if base is None:
+        base = config.load()
+    with open(path) as json_file:
+        entries = json.load(json_file)
+    if not isinstance(entries, list):
+        raise config.ConfigError("{} must contain a list of targets".format(path))
+    targets = []
+    names = set()
+    for entry in entries:
+        name = entry.get("name")
+        if not name or not re.match(r"^[\w.-]+$", name) or name in names:
+            raise config.ConfigError("Target names must be unique and made of letters, digits, '.', '-', '_' "
+                                     "(got {!r})".format(name))
+        names.add(name)
+        cfg = config.parse(dict(base.raw, **entry), base.path)
+        targets.append(Target(name=name,
+                              cfg=cfg,
+                              state_file=entry.get("state_file") or os.path.join(STATE_DIR, name + ".ip"),
+                              hostname=entry.get("hostname"),
+                              url=entry.get("url"),
+                              key=entry.get("key"),
+                              proxy=entry.get("proxy"),
+                              interval=entry.get("interval")))
+    return targets
+
+
+def fetch_url(target):
+    # Read as an IP service: streamed with a byte cap, `key` as a JSON key path
+    return services.Provider(target.name, target.url, "json" if target.key else "text", key=target.key).ip()
+
+
+def resolve_proxy(target):
+    proxies = {"http": target.proxy, "https": target.proxy}
+    return resolver.resolve_race(services.default_services(proxies), quiet=True).ip
+
+
+async def resolve_target(target):
+    loop = asyncio.get_running_loop()
+    if target.hostname:
+        infos = await loop.getaddrinfo(target.hostname, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+        ip = infos[0][4][0]
+    elif target.url:
+        ip = await loop.run_in_executor(None, fetch_url, target)
+    elif target.proxy:
+        ip = await loop.run_in_executor(None, resolve_proxy, target)
+    else:
+        raise config.ConfigError("Target '{}' has no hostname, url or proxy".format(target.name))
+    return str(ipaddress.ip_address(ip.strip()))
+
+
+def source(target):
+    return "hostname" if target.hostname else "url" if target.url else "proxy"
+
+
+async def check_target(target, semaphore, box, store=None):
+    from notifications import notification
+
+    async with semaphore:
+        start = time.monotonic()
+        try:
+            new_ip = await asyncio.wait_for(resolve_target(target), services.timeout * 2)
+        except Exception as error:
+            log.warning("- [{}] Exception when requesting ip: {}".format(target.name, error or type(error).__name__),
+                        site=target.name, error=str(error) or type(error).__name__)
+            return "failed"
+        latency = time.monotonic() - start
+        stored = state.read(target.state_file)
+        old_ip = stored[0] if stored else None
+        if old_ip == new_ip:
+            return "same"
+        loop = asyncio.get_running_loop()
+        # The change is queued before the state moves on, so a crash in between
+        # notifies it again rather than losing it
+        if old_ip is not None:
+            await loop.run_in_executor(None, box.enqueue, notification.channel_names(target.cfg), old_ip, new_ip,
+                                       None, None, target.name)
+        state.write(target.state_file, new_ip)
+        if store is not None:
+            await loop.run_in_executor(None, store.append, old_ip, new_ip, source(target), latency, 4, target.name)
+        if old_ip is None:
+            log.info("- [{}] First check, current address: {}".format(target.name, new_ip), site=target.name,
+                     new_ip=new_ip)
+            return "new"
+        log.info("- [{}] IP has changed from {} to {} ({:.2f} seconds)".format(target.name, old_ip, new_ip, latency),
+                 site=target.name, old_ip=old_ip, new_ip=new_ip, service=source(target), latency=round(latency, 3))
+        return "changed"
+
+
+async def check_all(targets, semaphore, box, store=None):
+    from notifications import outbox
+
+    start = time.monotonic()
+    outcomes = await asyncio.gather(*(check_target(target, semaphore, box, store) for target in targets))
+    # Notifications of the pass (and retries due) are delivered from the outbox
+    loop = asyncio.get_running_loop()
+    next_due = await loop.run_in_executor(None, box.next_due)
+    if "changed" in outcomes or (next_due is not None and next_due <= time.time()):
+        by_name = {target.name: target.cfg for target in targets}
+        await loop.run_in_executor(None, lambda: outbox.drain(by_name.__getitem__, box=box))
+    counts = {outcome: outcomes.count(outcome) for outcome in set(outcomes)}
+    duration = time.monotonic() - start
+    log.info("- Fleet check of {} targets in {:.2f} seconds: {}".format(
+        len(targets), duration, ", ".join("{} {}".format(count, outcome) for outcome, count in sorted(counts.items()))),
+        targets=len(targets), duration=round(duration, 3), **counts)
+    return outcomes
+
+
+async def run(targets, concurrency=None, interval=None):
+    from notifications import outbox
+
+    concurrency = concurrency or default_concurrency
+    loop = asyncio.get_running_loop()
+    # Blocking work (HTTP, notifications) runs in a bounded pool
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    # One history database for the whole fleet, rows tagged with the target name
+    store = history.History()
+    # and one outbox connection, shared by the checks and the drains
+    box = outbox.Outbox()
+    if interval is None:
+        try:
+            return await check_all(targets, semaphore, box, store)
+        finally:
+            box.close()
+            store.close()
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    while not stop.is_set():
+        now = time.monotonic()
+        due = [target for target in targets if target.next_check <= now]
+        for target in due:
+            target.next_check = now + (target.interval or interval)
+        if due:
+            await check_all(due, semaphore, box, store)
+        wake = min(target.next_check for target in targets)
+        try:
+            await asyncio.wait_for(stop.wait(), max(0, wake - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+    box.close()
+    store.close()
+    log.info("- Fleet stopped")
+
+
+def run_fleet(path=TARGETS_FILE, concurrency=None, interval=None):
+    targets = load_targets(path)
+    log.info("*** Fleet of {} targets, {} concurrent checks ***".format(len(targets),
+                                                                        concurrency or default_concurrency))
+    return asyncio.run(run(targets, concurrency, interval))
+
+
+# --------------
+# EndOfFile
+# --------------
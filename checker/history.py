@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Append-only history of the IP changes, in SQLite (history.db next to ip.log).
+# Rows are indexed on (site, family, ts) and (site, ts), so "changes in a time
+# range" (of one family or both) and "time spent on each IP" are index range
+# scans: O(log n) to find the range, plus the rows returned. Old rows can be
+# rotated into an archive database; the last one of each (site, family) stays
+# as the baseline of the address held at the cutoff.
+#
+#   python3 -m checker.history changes --from 2026-01-01 --to 2026-02-01
+#   python3 -m checker.history durations --from 2026-01-01 --family 6
+#   python3 -m checker.history rotate --keep-days 365
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from checker import config
+
+
+HISTORY_FILE = os.path.join(config.CONFIG_DIR, "history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    ts      REAL    NOT NULL,
+    site    TEXT    NOT NULL DEFAULT '',
+    family  INTEGER NOT NULL DEFAULT 4,
+    old_ip  TEXT,
+    new_ip  TEXT    NOT NULL,
+    service TEXT,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS changes_site_family_ts ON changes (site, family, ts);
+CREATE INDEX IF NOT EXISTS changes_site_ts ON changes (site, ts);
+"""
+
+COLUMNS = "ts, site, family, old_ip, new_ip, service, latency"
+
+
+class History:
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def append(self, old_ip, new_ip, service=None, latency=None, family=4, site="", ts=None):
+        with self._lock, self.db:
+            self.db.execute("INSERT INTO changes ({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(COLUMNS),
+                            (ts or time.time(), site, family, old_ip, new_ip, service, latency))
+
+    def changes(self, start=None, end=None, family=None, site=""):
+        query = "SELECT {} FROM changes WHERE site = ? AND ts >= ? AND ts < ?".format(COLUMNS)
+        params = [site, start or 0, end or float("inf")]
+        if family is not None:
+            query += " AND family = ?"
+            params.append(family)
+        with self._lock:
+            return self.db.execute(query + " ORDER BY ts", params).fetchall()
+
+    def ip_at(self, ts, family=4, site=""):
+        with self._lock:
+            row = self.db.execute("SELECT new_ip FROM changes WHERE site = ? AND family = ? AND ts < ? "
+                                  "ORDER BY ts DESC LIMIT 1", (site, family, ts)).fetchone()
+        return row[0] if row else None
+
+    # Seconds spent on each address between start and end
+    def durations(self, start=None, end=None, family=4, site=""):
+        start = start or 0
+        end = min(end or time.time(), time.time())
+        totals = {}
+        current = self.ip_at(start, family, site)
+        since = start
+        for row in self.changes(start, end, family, site):
+            if current is not None:
+                totals[current] = totals.get(current, 0) + row[0] - since
+            current, since = row[4], row[0]
+        if current is not None:
+            totals[current] = totals.get(current, 0) + end - since
+        return totals
+
+    # Moves the rows older than `keep_days` into an archive database, but the
+    # newest of each (site, family): ip_at() and durations() still need it
+    def rotate(self, keep_days, archive=True):
+        cutoff = time.time() - keep_days * 86400
+        where = ("ts < ? AND rowid NOT IN (SELECT rowid FROM (SELECT rowid, MAX(ts) FROM changes WHERE ts < ? "
+                 "GROUP BY site, family))")
+        with self._lock, self.db:
+            if archive:
+                archive_path = "{}.{}".format(self.path, datetime.now().strftime("%Y%m%d%H%M%S"))
+                self.db.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+                self.db.execute("CREATE TABLE archive.changes AS SELECT {} FROM changes WHERE {}".format(COLUMNS,
+                                                                                                       where),
+                                (cutoff, cutoff))
+            moved = self.db.execute("DELETE FROM changes WHERE " + where, (cutoff, cutoff)).rowcount
+        if archive:
+            with self._lock:
+                self.db.execute("DETACH DATABASE archive")
+        return moved
+
+
+def parse_time(text):
+    if text is None:
+        return None
+    return datetime.fromisoformat(text).timestamp()
+
+
+def format_time(ts):
+    return datetime.fromtimestamp(ts).strftime("%d-%m-%Y %H:%M:%S")
+
+
+def format_duration(seconds):
+    days, seconds = divmod(int(seconds), 86400)
+    hours, seconds = divmod(seconds, 3600)
+    return "{}d {:02}h {:02}m".format(days, hours, seconds // 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the IP change history")
+    parser.add_argument("--db", default=HISTORY_FILE, help="history database (default: {})".format(HISTORY_FILE))
+    parser.add_argument("--site", default="", help="fleet target name (default: this host)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("changes", "list the changes in a time range"),
+                            ("durations", "time spent on each IP in a time range")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--from", dest="start", help="start, ISO format (e.g. 2026-01-01 or 2026-01-01T08:00)")
+        command.add_argument("--to", dest="end", help="end, ISO format (default: now)")
+        command.add_argument("--family", type=int, choices=(4, 6), default=4 if name == "durations" else None)
+    rotate = commands.add_parser("rotate", help="archive and remove the old changes")
+    rotate.add_argument("--keep-days", type=int, required=True)
+    rotate.add_argument("--no-archive", action="store_true", help="delete the old changes without archiving them")
+    args = parser.parse_args()
+
+    history = History(args.db)
+    if args.command == "changes":
+        for ts, _, family, old_ip, new_ip, service, latency in history.changes(parse_time(args.start),
+                                                                              parse_time(args.end),
+                                                                              args.family, args.site):
+            print("{}  IPv{}  {} -> {}  ({}{})".format(format_time(ts), family, old_ip or "-", new_ip,
+                                                       service or "unknown",
+                                                       ", {:.2f}s".format(latency) if latency is not None else ""))
+    elif args.command == "durations":
+        durations = history.durations(parse_time(args.start), parse_time(args.end), args.family, args.site)
+        for ip, seconds in sorted(durations.items(), key=lambda item: -item[1]):
+            print("{:<40} {}".format(ip, format_duration(seconds)))
+    else:
+        print("Moved {} changes out of the history".format(history.rotate(args.keep_days, not args.no_archive)))
+    history.close()
+
+
+if __name__ == '__main__':
+    main()
+
+
+# --------------
+# EndOfFile
+# --------------
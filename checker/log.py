@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+# Logging of the checks. Messages keep the historical console text ("- IP has
+# changed from ...") and carry structured fields (service, latency, old/new IP):
+#   text - the message only, on stdout (default, as the former print calls)
+#   json - one JSON object per line: ts, level, msg and the fields
+# With a log file the tool rotates it itself, when it reaches `max_bytes` and
+# when a new period of `max_age` days starts (cron runs included), keeping
+# `backups` old files, instead of cron appending to it forever.
+# Quiet mode: the info records of a check are held back and dropped when the
+# IP did not change; warnings and errors are always written.
+
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+FORMATS = ("text", "json")
+LEVELS  = ("debug", "info", "warning", "error")
+
+log_format  = os.environ.get('IPCHANGE_LOG_FORMAT', "text")
+log_level   = os.environ.get('IPCHANGE_LOG_LEVEL', "info")
+log_file    = os.environ.get('IPCHANGE_LOG_FILE')
+max_bytes   = int(os.environ.get('IPCHANGE_LOG_MAX_BYTES', "1048576"))
+backups     = int(os.environ.get('IPCHANGE_LOG_BACKUPS', "5"))
+max_age     = float(os.environ.get('IPCHANGE_LOG_MAX_AGE', "30"))
+quiet       = os.environ.get('IPCHANGE_LOG_QUIET', "false").lower() == "true"
+
+logger = logging.getLogger("ipchange")
+logger.propagate = False
+
+_held = None
+_held_lock = threading.Lock()
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname.lower(),
+                 "msg": record.getMessage().strip("-* ")}
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# Writes to the current sys.stdout (redirected by the benchmarks, reconfigured by the daemon)
+class StdoutHandler(logging.StreamHandler):
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+
+    def __init__(self, filename, max_bytes=0, backups=0, max_age=0):
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.period = max_age * 86400
+        try:
+            self.started = os.stat(filename).st_mtime
+        except OSError:
+            self.started = time.time()
+
+    def shouldRollover(self, record):
+        if self.period > 0 and record.created // self.period != self.started // self.period:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.started = time.time()
+
+
+class HoldFilter(logging.Filter):
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        with _held_lock:
+            if _held is None:
+                return True
+            _held.append(record)
+            return False
+
+
+def setup(path=None, fmt=None, level=None, quiet_mode=None):
+    global quiet
+    path = path if path is not None else log_file
+    fmt = fmt or log_format
+    if quiet_mode is not None:
+        quiet = quiet_mode
+    if path:
+        handler = RotatingFileHandler(path, max_bytes, backups, max_age)
+    else:
+        handler = StdoutHandler()
+    handler.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter("%(message)s"))
+    handler.addFilter(HoldFilter())
+    for previous in list(logger.handlers):
+        logger.removeHandler(previous)
+        previous.close()
+    logger.addHandler(handler)
+    logger.setLevel((level or log_level).upper())
+
+
+# Quiet mode: holds the info records until end_check() tells whether to write them
+def begin_check():
+    global _held
+    if quiet:
+        with _held_lock:
+            _held = []
+
+
+def end_check(keep):
+    global _held
+    with _held_lock:
+        held, _held = _held, None
+    if keep and held:
+        for record in held:
+            logger.handle(record)
+
+
+def log(level, message, fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
+
+
+def debug(message, **fields):
+    log(logging.DEBUG, message, fields)
+
+
+def info(message, **fields):
+    log(logging.INFO, message, fields)
+
+
+def warning(message, **fields):
+    log(logging.WARNING, message, fields)
+
+
+def error(message, exc_info=False, **fields):
+    logger.error(message, exc_info=exc_info, extra={"fields": fields})
+
+
+setup()
+
+
+# --------------
+# EndOfFile
+# --------------
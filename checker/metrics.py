@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+# In-process metrics rendered in the Prometheus text exposition format, without
+# a client library: served over HTTP in daemon mode (serve) or written for the
+# node_exporter textfile collector in cron mode (write_textfile). In cron mode
+# the counters and histograms cover the last run only.
+
+import os
+import threading
+import time
+
+from checker import state
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def label_text(names, values):
+    if not names:
+        return ""
+    pairs = ('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+             for name, value in zip(names, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+def number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield self.name, label_text(self.labels, key), value
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.help_text), "# TYPE {} {}".format(self.name, self.kind)]
+        lines.extend("{}{} {}".format(name, labels, number(value)) for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with _lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, *labels):
+        with _lock:
+            counts, total = self.values.get(labels, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        for key, (counts, total) in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield (self.name + "_bucket", label_text(self.labels + ("le",), key + (number(bound),)), count)
+            yield self.name + "_sum", label_text(self.labels, key), total
+            yield self.name + "_count", label_text(self.labels, key), counts[-1]
+
+
+def register(metric):
+    with _lock:
+        return _metrics.setdefault(metric.name, metric)
+
+
+service_latency = register(Histogram("ipchange_service_request_seconds",
+                                     "Latency of the IP service requests", ("service", "outcome")))
+service_requests = register(Counter("ipchange_service_requests_total",
+                                    "IP service requests by outcome (success, failure)", ("service", "outcome")))
+check_duration = register(Histogram("ipchange_check_duration_seconds", "Duration of the IP checks"))
+checks = register(Counter("ipchange_checks_total", "IP checks by outcome (changed, same, failed)", ("outcome",)))
+last_check = register(Gauge("ipchange_last_check_timestamp_seconds", "Time of the last IP check"))
+last_change = register(Gauge("ipchange_last_change_timestamp_seconds", "Time of the last IP change"))
+notification_latency = register(Histogram("ipchange_notification_seconds",
+                                          "Latency of the notifications per channel", ("channel", "outcome")))
+notifications = register(Counter("ipchange_notifications_total",
+                                 "Notifications per channel by outcome (sent, failed)", ("channel", "outcome")))
+
+
+# Rendered under the lock: the checks update the values (and the histogram
+# counts in place) from other threads
+def render():
+    with _lock:
+        return "\n".join(metric.render() for metric in _metrics.values()) + "\n"
+
+
+def observe_check(outcome, duration):
+    check_duration.observe(duration)
+    checks.inc(outcome)
+    last_check.set(time.time())
+
+
+def write_textfile(path):
+    state.atomic_write(path, render(), fsync="never")
+
+
+def serve(port, address=None):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((address or os.environ.get('IPCHANGE_METRICS_ADDR', "127.0.0.1"), port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --------------
+# EndOfFile
+# --------------
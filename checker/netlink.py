@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Linux only helpers for hosts holding their public address on a local
+# interface (PPPoE, DHCP WAN, cloud VMs):
+# - NetlinkWatcher listens to rtnetlink address and route events and calls
+#   back as soon as something changed, to wake the daemon immediately;
+# - local_fingerprint() summarizes the default routes and the addresses of the
+#   default route interfaces, so a check can skip the external services when
+#   nothing changed locally.
+
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+from checker import state
+
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE  = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE  = 0x400
+
+RTM_NEWADDR  = 20
+RTM_DELADDR  = 21
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+
+NLMSG_HEADER = struct.Struct("=LHHLL")
+
+EVENTS = {RTM_NEWADDR: "new address", RTM_DELADDR: "deleted address",
+          RTM_NEWROUTE: "new route", RTM_DELROUTE: "deleted route"}
+
+
+def parse_events(data):
+    events = []
+    offset = 0
+    while offset + NLMSG_HEADER.size <= len(data):
+        length, message_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+        if length < NLMSG_HEADER.size:
+            break
+        if message_type in EVENTS:
+            events.append(EVENTS[message_type])
+        offset += (length + 3) & ~3
+    return events
+
+
+# Calls `callback(events)` once the address/route events settled for `settle`
+# seconds, so a PPPoE reconnection (address removed, added, routes replaced)
+# triggers a single check.
+class NetlinkWatcher:
+
+    def __init__(self, callback, settle=2.0):
+        self.callback = callback
+        self.settle = settle
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR | RTMGRP_IPV6_ROUTE))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def read_events(self, timeout):
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return None
+        return parse_events(self.sock.recv(65536))
+
+    def run(self):
+        while not self._stop.is_set():
+            events = self.read_events(1.0)
+            if not events:
+                continue
+            # Collect the burst of events until the interface settled
+            deadline = time.monotonic() + self.settle
+            while time.monotonic() < deadline:
+                more = self.read_events(max(0, deadline - time.monotonic()))
+                if more:
+                    events.extend(more)
+            if not self._stop.is_set():
+                self.callback(sorted(set(events)))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.sock.close()
+
+
+def default_routes():
+    routes = []
+    try:
+        with open("/proc/net/route") as route_file:
+            next(route_file)
+            for line in route_file:
+                fields = line.split()
+                if len(fields) > 7 and fields[1] == "00000000" and fields[7] == "00000000":
+                    gateway = socket.inet_ntoa(struct.pack("<L", int(fields[2], 16)))
+                    routes.append((fields[0], gateway))
+    except OSError:
+        pass
+    try:
+        with open("/proc/net/ipv6_route") as route_file:
+            for line in route_file:
+                fields = line.split()
+                if len(fields) == 10 and fields[0] == "0" * 32 and fields[1] == "00" and fields[9] != "lo":
+                    routes.append((fields[9], str(socket.inet_ntop(socket.AF_INET6, bytes.fromhex(fields[4])))))
+    except OSError:
+        pass
+    return sorted(set(routes))
+
+
+def source_address(family, probe):
+    # connect() on an UDP socket only selects the route and source address,
+    # no packet is sent
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.connect((probe, 53))
+            return sock.getsockname()[0]
+        except OSError:
+            return None
+
+
+def interface_ipv6_addresses(interfaces):
+    addresses = []
+    try:
+        with open("/proc/net/if_inet6") as address_file:
+            for line in address_file:
+                fields = line.split()
+                # scope 00: global addresses only
+                if len(fields) == 6 and fields[3] == "00" and fields[5] in interfaces:
+                    addresses.append(socket.inet_ntop(socket.AF_INET6, bytes.fromhex(fields[0])))
+    except OSError:
+        pass
+    return sorted(addresses)
+
+
+def local_fingerprint():
+    routes = default_routes()
+    interfaces = {interface for interface, _ in routes}
+    return json.dumps({"routes": routes,
+                       "ipv4": source_address(socket.AF_INET, "198.51.100.1"),
+                       "ipv6": source_address(socket.AF_INET6, "2001:db8::1"),
+                       "ipv6_addresses": interface_ipv6_addresses(interfaces)}, sort_keys=True)
+
+
+# Stored fingerprint of the last external check, with its age
+def read_fingerprint(path):
+    try:
+        with open(path) as fingerprint_file:
+            return fingerprint_file.read(), time.time() - os.stat(path).st_mtime
+    except OSError:
+        return None, None
+
+
+def write_fingerprint(path, fingerprint):
+    state.atomic_write(path, fingerprint, fsync="never")
+
+
+# --------------
+# EndOfFile
+# --------------
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+import collections
+import ipaddress
+import os
+import queue
+import threading
+import time
+
+from checker import log
+from checker import metrics
+from checker import services as ip_services
+
+
+Resolution = collections.namedtuple("Resolution", ["ip", "service", "latency"])
+
+MODES = ("sequential", "race")
+
+ipv6_grace = float(os.environ.get('IPCHANGE_IPV6_GRACE', "1"))
+
+
+def no_service_error(services):
+    error = "Non available services, add more services or increase the timeout (services = {}, timeout = {}) ".format(
+        len(services), ip_services.timeout)
+    return RuntimeError(error)
+
+
+# Rejects answers that are not an address of the service family (e.g. an IPv6
+# address from a dual-stack service, or an error page)
+def validate(service, ip):
+    address = ipaddress.ip_address(str(ip).strip())
+    if address.version != service.family:
+        raise ValueError("'{}' is not an IPv{} address".format(address, service.family))
+    return str(address)
+
+
+def record(scoreboard, service, latency, error):
+    outcome = "success" if error is None else "failure"
+    metrics.service_latency.observe(latency, service.name, outcome)
+    metrics.service_requests.inc(service.name, outcome)
+    if scoreboard is None:
+        return
+    if error is None:
+        scoreboard.record_success(service.name, latency)
+    else:
+        scoreboard.record_failure(service.name, latency)
+
+
+def resolve_sequential(services, scoreboard=None):
+    for service in services:
+        start = time.time()
+        try:
+            log.info("- Requesting current ip with '{}'".format(service.name), service=service.name)
+            ip = validate(service, service.ip())
+            latency = time.time() - start
+            record(scoreboard, service, latency, None)
+            log.info("- Request took {} seconds ".format(int(latency)), service=service.name,
+                     latency=round(latency, 3))
+            return Resolution(ip, service.name, latency)
+        except Exception as error:
+            record(scoreboard, service, time.time() - start, error)
+            log.warning("- Exception when requesting ip using '{}': {} ".format(service.name, error),
+                        service=service.name, error=str(error))
+
+    raise no_service_error(services)
+
+
+# Races the services: the first one starts immediately, the next one is started
+# after `hedge_delay` seconds without an answer (or as soon as one fails); with a
+# zero hedge delay they all start at once. The first valid answer wins, services
+# not started yet are never started and the answers of the losers are dropped.
+# Workers are daemon threads so a losing request never delays the process exit;
+# a loser still updates the scoreboard if it completes later.
+def resolve_race(services, hedge_delay=0.0, scoreboard=None, quiet=False):
+    say = (lambda *args, **fields: None) if quiet else log.info
+    results = queue.Queue()
+    pending = collections.deque(services)
+    running = 0
+
+    def worker(service, start):
+        try:
+            ip = validate(service, service.ip())
+            error = None
+        except Exception as exception:
+            ip = None
+            error = exception
+        latency = time.monotonic() - start
+        record(scoreboard, service, latency, error)
+        results.put((service, ip, latency, error))
+
+    def start_next():
+        service = pending.popleft()
+        say("- Requesting current ip with '{}'".format(service.name), service=service.name)
+        threading.Thread(target=worker, args=(service, time.monotonic()), daemon=True).start()
+
+    while pending or running:
+        if pending and (running == 0 or hedge_delay <= 0):
+            start_next()
+            running += 1
+            continue
+        try:
+            service, ip, latency, error = results.get(timeout=hedge_delay if pending else None)
+        except queue.Empty:
+            start_next()
+            running += 1
+            continue
+        running -= 1
+        if error is None:
+            say("- Request took {} seconds with '{}'".format(int(latency), service.name), service=service.name,
+                latency=round(latency, 3))
+            return Resolution(ip, service.name, latency)
+        say("- Exception when requesting ip using '{}': {} ".format(service.name, error), service=service.name,
+            error=str(error))
+        if pending and hedge_delay > 0:
+            start_next()
+            running += 1
+
+    raise no_service_error(services)
+
+
+def resolve(services=None, mode="sequential", hedge_delay=0.0, scoreboard=None, family=4):
+    if services is None:
+        services = ip_services.default_services(family=family)
+    if scoreboard is not None:
+        services = scoreboard.order(services)
+    if mode == "race":
+        return resolve_race(services, hedge_delay, scoreboard)
+    return resolve_sequential(services, scoreboard)
+
+
+# Resolves the IPv4 and the IPv6 address at the same time, so a dual-stack
+# check takes as long as the slowest family rather than the sum of both.
+# A failing IPv6 resolution is not fatal (the host may have no IPv6
+# connectivity): its Resolution is None.
+def resolve_dual(mode="sequential", hedge_delay=0.0, scoreboard=None):
+    ipv6 = []
+
+    def resolve_ipv6():
+        try:
+            ipv6.append(resolve(None, mode, hedge_delay, scoreboard, family=6))
+        except Exception as error:
+            log.warning("- IPv6 address not available: {}".format(error), family=6)
+
+    thread = threading.Thread(target=resolve_ipv6, daemon=True)
+    thread.start()
+    ipv4 = resolve(None, mode, hedge_delay, scoreboard, family=4)
+    # IPv6 gets a short grace period once IPv4 is known, a lookup still running
+    # after it counts as unavailable instead of holding up the check
+    thread.join(ipv6_grace)
+    if thread.is_alive():
+        log.warning("- IPv6 address not available: no answer {} seconds after IPv4".format(ipv6_grace), family=6)
+        return ipv4, None
+    return ipv4, (ipv6[0] if ipv6 else None)
+
+
+def ipv6_changed(old_ip, new_ip, prefix_length=64):
+    if not old_ip:
+        return bool(new_ip)
+    if not new_ip:
+        return False
+    if prefix_length >= 128:
+        return ipaddress.ip_address(old_ip) != ipaddress.ip_address(new_ip)
+    return (ipaddress.ip_interface("{}/{}".format(old_ip, prefix_length)).network !=
+            ipaddress.ip_interface("{}/{}".format(new_ip, prefix_length)).network)
+
+
+# --------------
+# EndOfFile
+# --------------
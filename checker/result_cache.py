@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+# Short-lived cache of the last resolution, shared on disk (next to ip.log) by
+# every process using the same folder: cron runs, manual runs, containers on a
+# shared volume. A check started while another one is running waits for its
+# lock and then reuses its fresh answer instead of querying the IP services
+# again. Entries older than `ttl` seconds are ignored. Storing costs one small
+# file write per resolution (no fsync), so only the cron and manual runs store
+# theirs; `ttl` 0 disables the cache and the write.
+
+import json
+import os
+import time
+
+from checker import resolver
+from checker import state
+
+ttl = float(os.environ.get('IPCHANGE_RESULT_TTL', "30"))
+
+
+def encode(resolution):
+    return None if resolution is None else resolution._asdict()
+
+
+def decode(entry):
+    return None if entry is None else resolver.Resolution(entry["ip"], entry["service"], entry["latency"])
+
+
+# Returns (ipv4, ipv6) Resolutions, or None when missing, stale or resolved
+# without IPv6 while `ipv6` is requested
+def load(path, ipv6=False, now=None):
+    if ttl <= 0:
+        return None
+    try:
+        with open(path) as json_file:
+            cached = json.load(json_file)
+        if not 0 <= (now or time.time()) - cached["ts"] <= ttl or (ipv6 and not cached["ipv6"]):
+            return None
+        return decode(cached["v4"]), decode(cached["v6"])
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return None
+
+
+def store(path, ipv4, ipv6=None, ipv6_requested=False):
+    if ttl <= 0:
+        return
+    state.atomic_write(path, json.dumps({"ts": time.time(), "ipv6": ipv6_requested,
+                                         "v4": encode(ipv4), "v6": encode(ipv6)}), fsync="never")
+
+
+# --------------
+# EndOfFile
+# --------------
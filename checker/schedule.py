@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+import json
+import os
+import random
+import time
+
+from checker import state
+
+min_interval = float(os.environ.get('IPCHANGE_MIN_INTERVAL', "2"))  # minutes
+backoff_factor = float(os.environ.get('IPCHANGE_BACKOFF_FACTOR', "2"))
+
+CHANGED = "changed"
+FAILED  = "failed"
+SAME    = "same"
+NEW     = "new"
+
+
+# Adaptive polling interval: back to `minimum` seconds right after a change or a
+# failed check (a change often comes with more, a failure may hide one), then
+# multiplied by `factor` after every check with the same IP, up to `maximum`.
+# A random jitter (up to `jitter` seconds) is added so a fleet of hosts does not
+# poll the IP services in lockstep.
+# In cron mode the interval and the next due time are persisted as JSON (next
+# to ip.log): cron starts the script every `minimum` minutes and the runs that
+# are not due yet exit right away.
+class AdaptiveSchedule:
+
+    def __init__(self, minimum, maximum, factor=None, jitter=0, path=None):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.factor = factor or backoff_factor
+        self.jitter = jitter
+        self.path = path
+        self.interval = self.minimum
+        self.next_due = 0
+        self.load()
+
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as json_file:
+                saved = json.load(json_file)
+            self.interval = min(self.maximum, max(self.minimum, float(saved["interval"])))
+            self.next_due = float(saved["next_due"])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            pass
+
+    def save(self):
+        if self.path is not None:
+            state.atomic_write(self.path, json.dumps({"interval": self.interval, "next_due": self.next_due}),
+                               fsync="never")
+
+    # `slack`: cron starts the runs on minute boundaries, a run a few seconds early counts as due
+    def due(self, now=None, slack=0):
+        return (now or time.time()) + slack >= self.next_due
+
+    # Returns the delay before the next check, given the outcome of the last one
+    def update(self, outcome, now=None):
+        if outcome in (CHANGED, FAILED):
+            self.interval = self.minimum
+        else:
+            self.interval = min(self.maximum, self.interval * self.factor)
+        delay = self.interval + (random.uniform(0, self.jitter) if self.jitter > 0 else 0)
+        self.next_due = (now or time.time()) + delay
+        self.save()
+        return delay
+
+
+# --------------
+# EndOfFile
+# --------------
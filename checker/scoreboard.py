@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+import json
+import os
+import threading
+import time
+
+from checker import state
+
+alpha             = float(os.environ.get('IPCHANGE_SCORE_ALPHA', "0.3"))
+failure_threshold = int(os.environ.get('IPCHANGE_CIRCUIT_FAILURES', "3"))
+open_seconds      = int(os.environ.get('IPCHANGE_CIRCUIT_COOLDOWN', "1800"))
+failure_latency   = 10.0
+
+CLOSED    = "closed"
+OPEN      = "open"
+HALF_OPEN = "half-open"
+
+
+# Per-service latency/success scoreboard persisted as JSON (next to ip.log).
+# Services are ordered by expected cost (EWMA latency / EWMA success rate).
+# After `failure_threshold` consecutive failures a service's circuit opens and
+# it is only tried after the closed ones; once `open_seconds` have passed it is
+# half-open and one of them is tried first as a probe, a success closes the
+# circuit, a failure re-opens it. The other open and half-open services stay
+# last resorts, so a check after an outage does not rely on the probe alone.
+# The file is only rewritten when something significant changed, so cron runs
+# of an healthy setup do not rewrite it every time.
+class Scoreboard:
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as json_file:
+                self.stats = json.load(json_file)
+        except (FileNotFoundError, ValueError):
+            self.stats = {}
+        self.dirty = False
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            state.atomic_write(self.path, json.dumps(self.stats), fsync="never")
+            self.dirty = False
+
+    def entry(self, name):
+        return self.stats.setdefault(name, {"latency": None, "saved_latency": None, "success_rate": 1.0,
+                                            "failures": 0, "opened_at": None})
+
+    def state(self, name, now=None):
+        entry = self.stats.get(name)
+        if entry is None or entry["opened_at"] is None:
+            return CLOSED
+        if (now or time.time()) - entry["opened_at"] >= open_seconds:
+            return HALF_OPEN
+        return OPEN
+
+    def cost(self, name):
+        entry = self.stats.get(name)
+        if entry is None:
+            return 0.0
+        # A service that only ever failed is costed as a timeout
+        latency = entry["latency"] if entry["latency"] is not None else failure_latency
+        return latency / max(entry["success_rate"], 0.01)
+
+    def order(self, services):
+        now = time.time()
+        states = {service.name: self.state(service.name, now) for service in services}
+        probes = [service for service in services if states[service.name] == HALF_OPEN]
+        closed = sorted((service for service in services if states[service.name] == CLOSED),
+                        key=lambda service: self.cost(service.name))
+        # Better to try the open circuits too than to fail the check
+        rest = sorted((service for service in services if service not in closed and service not in probes[:1]),
+                      key=lambda service: self.cost(service.name))
+        return probes[:1] + closed + rest
+
+    def record_success(self, name, latency):
+        with self._lock:
+            entry = self.entry(name)
+            entry["latency"] = latency if entry["latency"] is None else (alpha * latency +
+                                                                          (1 - alpha) * entry["latency"])
+            entry["success_rate"] = alpha + (1 - alpha) * entry["success_rate"]
+            if entry["failures"] or entry["opened_at"] is not None:
+                self.dirty = True
+            entry["failures"] = 0
+            entry["opened_at"] = None
+            saved = entry["saved_latency"]
+            if saved is None or abs(entry["latency"] - saved) > 0.25 * saved:
+                entry["saved_latency"] = entry["latency"]
+                self.dirty = True
+
+    def record_failure(self, name, latency):
+        with self._lock:
+            entry = self.entry(name)
+            entry["success_rate"] = (1 - alpha) * entry["success_rate"]
+            entry["failures"] += 1
+            if entry["failures"] >= failure_threshold:
+                entry["opened_at"] = time.time()
+            self.dirty = True
+
+
+# --------------
+# EndOfFile
+# --------------
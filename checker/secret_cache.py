@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+import os
+import threading
+import time
+
+
+ttl = float(os.environ.get('IPCHANGE_SECRET_TTL', "3600"))
+
+MAIL       = "Mail-OutageDetector"
+PUSHBULLET = "PushBullet-OutageDetector"
+IFTTT      = "IFTTT-OutageDetector"
+
+# In-memory cache in front of keyring: the encrypted file backend of
+# keyrings.alt derives its key on every access, so each secret is read once per
+# process and kept for `ttl` seconds. Missing secrets are not cached.
+_cache = {}
+_lock = threading.Lock()
+
+
+def _keyring():
+    # keyring is slow to import, only load it when a secret is really needed
+    import keyring
+    return keyring
+
+
+def get_password(service, username):
+    key = (service, username)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        password = _keyring().get_password(service, username)
+        if password is None:
+            _cache.pop(key, None)
+        else:
+            _cache[key] = (time.monotonic() + ttl, password)
+        return password
+
+
+def set_password(service, username, password):
+    with _lock:
+        _keyring().set_password(service, username, password)
+        _cache[(service, username)] = (time.monotonic() + ttl, password)
+
+
+def invalidate(service=None, username=None):
+    with _lock:
+        for key in list(_cache):
+            if (service is None or key[0] == service) and (username is None or key[1] == username):
+                del _cache[key]
+
+
+def config_secrets(cfg):
+    secrets = [(MAIL, cfg.sender)]
+    if cfg.notification_type == "pushbullet":
+        secrets.append((PUSHBULLET, "pushbullet"))
+    elif cfg.notification_type == "ifttt":
+        secrets.append((IFTTT, cfg.ifttt_event))
+    return secrets
+
+
+def prewarm(cfg):
+    missing = []
+    for service, username in config_secrets(cfg):
+        if get_password(service, username) is None:
+            missing.append(service)
+    return missing
+
+
+# --------------
+# EndOfFile
+# --------------
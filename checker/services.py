@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# IP services ("providers") are declarative: a URL, an extractor reading the
+# address from the answer, an address family and a timeout. The built-in ones
+# are listed in PROVIDERS; an "ip_services" list in config.json replaces them:
+#
+#   "ip_services": [{"name": "icanhazip", "url": "http://ipv4.icanhazip.com/"},
+#                   {"name": "myapi", "url": "https://api.example.com/me", "extractor": "json", "key": "net.ip"},
+#                   {"name": "page", "url": "http://example.com/ip.html", "extractor": "regex",
+#                    "pattern": "Address: ([0-9.]+)", "timeout": 5},
+#                   {"name": "icanhazip6", "url": "http://ipv6.icanhazip.com/", "family": 6}]
+#
+# Extractors: text (the whole body), json (dotted key path, list indexes
+# allowed) and regex (first group, or the whole match). Answers are streamed
+# and dropped beyond `max_bytes`, so a misbehaving endpoint cannot push a huge
+# or garbage payload; the address is then validated by the resolver.
+# "type": "dns" or "stun" services (checker.udp_services) need a single UDP
+# round trip; OpenDNS is tried first, the HTTP services are the fallback.
+
+import json
+import os
+import re
+
+from checker import config
+from checker import session
+
+
+timeout = 10
+max_bytes = int(os.environ.get('IPCHANGE_SERVICE_MAX_BYTES', "4096"))
+chunk_size = 1024
+
+EXTRACTORS = ("text", "json", "regex")
+TYPES      = ("http", "dns", "stun")
+
+PROVIDERS = [
+  {"name": "opendns", "type": "dns", "server": "208.67.222.222", "query": "myip.opendns.com"},
+  {"name": "icanhazip", "url": "http://ipv4.icanhazip.com/"},
+  {"name": "ipinfo", "url": "http://ipinfo.io/ip"},
+  {"name": "ip-api", "url": "http://ip-api.com/json?fields=query", "extractor": "json", "key": "query"},
+  #IPv6 only hosts: the request itself goes over IPv6
+  {"name": "opendns6", "type": "dns", "server": "2620:119:35::35", "query": "myip.opendns.com", "family": 6},
+  {"name": "icanhazip6", "url": "http://ipv6.icanhazip.com/", "family": 6},
+  {"name": "ipify6", "url": "http://api6.ipify.org/", "family": 6},
+]
+
+class Service:
+  name=""
+  url=""
+  family=4
+  proxies=None
+  timeout=None
+  def request(self, **kwargs):
+    return session.get_session().get(self.url, timeout = self.timeout or timeout, proxies = self.proxies, **kwargs)
+
+  #Body of the answer, at most max_bytes (the connection goes back to the pool once read)
+  def read(self):
+    response = self.request(stream = True)
+    try:
+      response.raise_for_status()
+      if int(response.headers.get("Content-Length") or 0) > max_bytes:
+        raise ValueError("'{}' answer is larger than {} bytes".format(self.name, max_bytes))
+      body = bytearray()
+      for chunk in response.iter_content(chunk_size):
+        body.extend(chunk)
+        if len(body) > max_bytes:
+          raise ValueError("'{}' answer is larger than {} bytes".format(self.name, max_bytes))
+      return body.decode(response.encoding or "utf-8", "replace")
+    finally:
+      response.close()
+
+class Provider(Service):
+  def __init__(self, name, url, extractor="text", key=None, pattern=None, family=4, timeout=None):
+    if extractor not in EXTRACTORS:
+      raise config.ConfigError("IP service '{}' has an unknown extractor '{}' (expected one of: {})".format(
+        name, extractor, ", ".join(EXTRACTORS)))
+    if extractor == "json" and not key:
+      raise config.ConfigError("IP service '{}' needs a 'key' for the json extractor".format(name))
+    if family not in (4, 6):
+      raise config.ConfigError("IP service '{}' family must be 4 or 6".format(name))
+    self.name = name
+    self.url = url
+    self.extractor = extractor
+    self.key = key
+    self.pattern = re.compile(pattern) if pattern else None
+    if extractor == "regex" and self.pattern is None:
+      raise config.ConfigError("IP service '{}' needs a 'pattern' for the regex extractor".format(name))
+    self.family = family
+    self.timeout = timeout
+
+  def ip(self):
+    body = self.read()
+    if self.extractor == "json":
+      value = json.loads(body)
+      for part in self.key.split("."):
+        value = value[int(part)] if isinstance(value, list) else value[part]
+      return str(value).strip()
+    if self.extractor == "regex":
+      match = self.pattern.search(body)
+      if match is None:
+        raise ValueError("'{}' answer does not match its pattern".format(self.name))
+      return (match.group(1) if self.pattern.groups else match.group(0)).strip()
+    return body.strip()
+
+def provider(entry):
+  kind = entry.get("type", "http") if isinstance(entry, dict) else None
+  if kind not in TYPES:
+    raise config.ConfigError("IP service {!r} has an unknown type (expected one of: {})".format(entry, ", ".join(TYPES)))
+  if kind != "http":
+    from checker import udp_services
+    if not entry.get("name") or not entry.get("server"):
+      raise config.ConfigError("Every {} IP service needs a 'name' and a 'server' (got {!r})".format(kind, entry))
+    if kind == "dns":
+      return udp_services.DNSService(entry["name"], entry["server"], entry.get("query", "myip.opendns.com"),
+                                     entry.get("record"), entry.get("port", 53), int(entry.get("family", 4)),
+                                     entry.get("timeout"))
+    return udp_services.STUNService(entry["name"], entry["server"], entry.get("port", 3478),
+                                    int(entry.get("family", 4)), entry.get("timeout"))
+  if not entry.get("name") or not entry.get("url"):
+    raise config.ConfigError("Every IP service needs a 'name' and an 'url' (got {!r})".format(entry))
+  return Provider(entry["name"], entry["url"], entry.get("extractor", "text"), entry.get("key"),
+                  entry.get("pattern"), int(entry.get("family", 4)), entry.get("timeout"))
+
+#Provider definitions: "ip_services" of config.json when set, the built-in ones otherwise
+def definitions():
+  try:
+    return config.load().get("ip_services") or PROVIDERS
+  except (FileNotFoundError, config.ConfigError):
+    return PROVIDERS
+
+def default_services(proxies=None, family=4):
+  services = [service for service in map(provider, definitions()) if service.family == family]
+  if proxies:
+    #UDP services cannot go through an HTTP proxy: they would answer with this host address
+    services = [service for service in services if isinstance(service, Provider)]
+  for service in services:
+    service.proxies = proxies
+  return services
+
+
+# --------------
+# EndOfFile
+# --------------
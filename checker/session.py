@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Shared keep-alive HTTP session used by the IP services and the notification
+# backends, so a long-lived process reuses DNS lookups and TCP/TLS connections.
+pool_connections = int(os.environ.get('HTTP_POOL_CONNECTIONS', "10"))
+pool_maxsize     = int(os.environ.get('HTTP_POOL_MAXSIZE', "4"))
+retries          = int(os.environ.get('HTTP_RETRIES', "0"))
+retry_backoff    = float(os.environ.get('HTTP_RETRY_BACKOFF', "0.3"))
+
+_lock = threading.Lock()
+_adapter = None
+_session = None
+
+
+def get_adapter():
+    global _adapter
+    with _lock:
+        if _adapter is None:
+            # Only idempotent requests are retried (urllib3 default), so POSTs
+            # to the notification backends are never sent twice. Read timeouts
+            # are never retried and connection errors only with HTTP_RETRIES:
+            # a hanging IP service must cost one timeout, the resolver falls
+            # back to the next service.
+            retry = Retry(total=retries, connect=retries, read=0, backoff_factor=retry_backoff,
+                          status_forcelist=(502, 503, 504), raise_on_status=False)
+            _adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=retry)
+        return _adapter
+
+
+def mount(session):
+    adapter = get_adapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        session = mount(requests.Session())
+        with _lock:
+            if _session is None:
+                _session = session
+    return _session
+
+
+def close():
+    global _adapter, _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _adapter = None
+
+
+# --------------
+# EndOfFile
+# --------------
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Crash-safe state files. A state record is "<ipv4>\n[<ipv6>\n]": it always fits
+# in RECORD_SIZE bytes and is read with a single read. Writes go to a temporary
+# file renamed over the previous one, so a crash or a container kill leaves
+# either the old or the new record, never an empty file, and are skipped when
+# the record did not change (fewer flash writes on SD cards).
+#
+# fsync policy (IPCHANGE_FSYNC):
+#   always - fsync the file and its folder (durable rename)
+#   file   - fsync the file only
+#   never  - leave it to the OS (atomic but not durable on power loss)
+
+import os
+import threading
+
+
+RECORD_SIZE    = 128
+FSYNC_POLICIES = ("always", "file", "never")
+
+fsync_policy = os.environ.get('IPCHANGE_FSYNC', "always")
+if fsync_policy not in FSYNC_POLICIES:
+    # A typo must not silently give up durability
+    raise ValueError("IPCHANGE_FSYNC must be one of {} (got {!r})".format(", ".join(FSYNC_POLICIES), fsync_policy))
+
+# Last record read or written per path, to skip unchanged writes
+_records = {}
+_lock = threading.Lock()
+
+
+def atomic_write(path, data, fsync=None):
+    fsync = fsync or fsync_policy
+    if isinstance(data, str):
+        data = data.encode()
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+        if fsync in ("always", "file"):
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+    if fsync == "always":
+        dir_fd = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def encode(ipv4, ipv6=None):
+    record = "{}\n".format(ipv4) if ipv6 is None else "{}\n{}\n".format(ipv4, ipv6)
+    return record.encode()
+
+
+def decode(data):
+    lines = data.decode("ascii", "replace").split("\n")
+    ipv4 = lines[0].strip()
+    if not ipv4:
+        return None
+    ipv6 = lines[1].strip() if len(lines) > 1 and lines[1].strip() else None
+    return ipv4, ipv6
+
+
+# Returns (ipv4, ipv6 or None), or None when there is no usable record yet
+# (missing file, or an empty file left by an older version)
+def read(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        data = os.read(fd, RECORD_SIZE)
+    finally:
+        os.close(fd)
+    record = decode(data)
+    with _lock:
+        _records[path] = data if record is not None else None
+    return record
+
+
+# Returns True when the record was written, False when it was unchanged
+def write(path, ipv4, ipv6=None, fsync=None):
+    data = encode(ipv4, ipv6)
+    with _lock:
+        if _records.get(path) == data:
+            return False
+    atomic_write(path, data, fsync)
+    with _lock:
+        _records[path] = data
+    return True
+
+
+# --------------
+# EndOfFile
+# --------------
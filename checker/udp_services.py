@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+# UDP IP services: a single datagram round trip instead of a TCP handshake and
+# an HTTP exchange. They implement the Service interface (name, family, ip())
+# and are declared like the HTTP ones, with their own server:
+#
+#   {"name": "opendns", "type": "dns", "server": "208.67.222.222", "query": "myip.opendns.com"}
+#   {"name": "google-dns", "type": "dns", "server": "216.239.32.10", "query": "o-o.myaddr.l.google.com",
+#    "record": "TXT"}
+#   {"name": "google-stun", "type": "stun", "server": "stun.l.google.com", "port": 19302}
+#
+# DNS: the authoritative server of a "what is my address" name answers with the
+# address the query came from (A/AAAA record, or TXT). STUN (RFC 5389): a
+# Binding request answered with the XOR-MAPPED-ADDRESS seen by the server.
+# Lost datagrams are sent again (0.25 s, 0.5 s, ...) until the timeout.
+
+import ipaddress
+import os
+import random
+import socket
+import struct
+import time
+
+from checker import config
+from checker import services
+
+RECORD_TYPES = {"A": 1, "AAAA": 28, "TXT": 16}
+
+STUN_BINDING_REQUEST  = 0x0001
+STUN_BINDING_RESPONSE = 0x0101
+STUN_MAGIC_COOKIE     = 0x2112A442
+STUN_MAPPED_ADDRESS   = 0x0001
+STUN_XOR_MAPPED_ADDRESS = (0x0020, 0x8020)
+
+
+# Sends `payload` to the server until `accept(answer)` returns a value or the timeout expires
+def exchange(server, port, family, payload, timeout, accept):
+  address_family = socket.AF_INET6 if family == 6 else socket.AF_INET
+  address = socket.getaddrinfo(server, port, address_family, socket.SOCK_DGRAM)[0][4]
+  deadline = time.monotonic() + timeout
+  retransmit = 0.25
+  with socket.socket(address_family, socket.SOCK_DGRAM) as sock:
+    sock.connect(address)
+    while True:
+      sock.send(payload)
+      wait_until = min(deadline, time.monotonic() + retransmit)
+      retransmit *= 2
+      while True:
+        remaining = wait_until - time.monotonic()
+        if remaining <= 0:
+          break
+        sock.settimeout(remaining)
+        try:
+          answer = accept(sock.recv(4096))
+        except socket.timeout:
+          break
+        if answer is not None:
+          return answer
+      if time.monotonic() >= deadline:
+        raise TimeoutError("no answer from {}:{} after {:.1f} seconds".format(server, port, timeout))
+
+def skip_name(data, offset):
+  while True:
+    length = data[offset]
+    if length & 0xC0 == 0xC0:
+      return offset + 2
+    if length == 0:
+      return offset + 1
+    offset += length + 1
+
+class DNSService(services.Service):
+  def __init__(self, name, server, query, record=None, port=53, family=4, timeout=None):
+    self.name = name
+    self.server = server
+    self.query = query
+    self.record = record or ("AAAA" if family == 6 else "A")
+    if self.record not in RECORD_TYPES:
+      raise config.ConfigError("IP service '{}' record must be one of: {}".format(
+        name, ", ".join(RECORD_TYPES)))
+    self.port = int(port)
+    self.family = family
+    self.timeout = timeout
+
+  def packet(self, ident):
+    labels = b"".join(bytes([len(label)]) + label.encode("ascii") for label in self.query.strip(".").split("."))
+    return (struct.pack(">HHHHHH", ident, 0x0100, 1, 0, 0, 0) + labels + b"\0" +
+            struct.pack(">HH", RECORD_TYPES[self.record], 1))
+
+  def answers(self, data, ident):
+    if len(data) < 12:
+      return None
+    answer_ident, flags, questions, count = struct.unpack(">HHHH", data[:8])
+    if answer_ident != ident or not flags & 0x8000:
+      return None
+    if flags & 0x0200:
+      raise ValueError("'{}' answer is truncated".format(self.name))
+    if flags & 0x000F:
+      raise ValueError("'{}' answered with DNS error code {}".format(self.name, flags & 0x000F))
+    offset = 12
+    for _ in range(questions):
+      offset = skip_name(data, offset) + 4
+    values = []
+    for _ in range(count):
+      offset = skip_name(data, offset)
+      record_type, _, _, length = struct.unpack(">HHIH", data[offset:offset + 10])
+      rdata = data[offset + 10:offset + 10 + length]
+      offset += 10 + length
+      if record_type != RECORD_TYPES[self.record]:
+        continue
+      if record_type == 1:
+        values.append(socket.inet_ntop(socket.AF_INET, rdata))
+      elif record_type == 28:
+        values.append(socket.inet_ntop(socket.AF_INET6, rdata))
+      else:
+        values.append(rdata[1:1 + rdata[0]].decode("ascii", "replace"))
+    return values
+
+  def ip(self):
+    ident = random.getrandbits(16)
+    values = exchange(self.server, self.port, self.family, self.packet(ident), self.timeout or services.timeout,
+                      lambda data: self.answers(data, ident))
+    #TXT answers may carry other strings (e.g. the EDNS client subnet): the first address wins
+    for value in values:
+      try:
+        ipaddress.ip_address(value.strip('"'))
+        return value.strip('"')
+      except ValueError:
+        continue
+    raise ValueError("'{}' answer holds no {} record with an address".format(self.name, self.record))
+
+class STUNService(services.Service):
+  def __init__(self, name, server, port=3478, family=4, timeout=None):
+    self.name = name
+    self.server = server
+    self.port = int(port)
+    self.family = family
+    self.timeout = timeout
+
+  def mapped_address(self, data, transaction):
+    if len(data) < 20:
+      return None
+    message_type, length, cookie = struct.unpack(">HHI", data[:8])
+    if message_type != STUN_BINDING_RESPONSE or cookie != STUN_MAGIC_COOKIE or data[8:20] != transaction:
+      return None
+    offset = 20
+    mapped = None
+    while offset + 4 <= min(len(data), 20 + length):
+      attribute, size = struct.unpack(">HH", data[offset:offset + 4])
+      value = data[offset + 4:offset + 4 + size]
+      offset += 4 + size + (-size % 4)
+      if attribute in STUN_XOR_MAPPED_ADDRESS:
+        key = data[4:8] if value[1] == 1 else data[4:20]
+        return str(ipaddress.ip_address(bytes(byte ^ mask for byte, mask in zip(value[4:], key))))
+      if attribute == STUN_MAPPED_ADDRESS:
+        mapped = str(ipaddress.ip_address(value[4:]))
+    if mapped is None:
+      raise ValueError("'{}' answer holds no mapped address".format(self.name))
+    return mapped
+
+  def ip(self):
+    transaction = os.urandom(12)
+    request = struct.pack(">HHI", STUN_BINDING_REQUEST, 0, STUN_MAGIC_COOKIE) + transaction
+    return exchange(self.server, self.port, self.family, request, self.timeout or services.timeout,
+                    lambda data: self.mapped_address(data, transaction))
+
+
+# --------------
+# EndOfFile
+# --------------
@@ -31,15 +31,16 @@
 # SOFTWARE.
 # -------------------------------------------------------------------------------
 
-import json
 import os
 import requests
 import socket
 import sys
 
 import getpass
-import keyring
 
+from checker import config
+from checker import schedule
+from checker import secret_cache
 from notifications import cron_scheduling
 from notifications import pushbullet_notification as pushbullet
 from notifications import ifttt_notification as ifttt
@@ -66,6 +67,7 @@ notification_password = os.environ.get('NOTIFICATION_PASSWORD', None)
 ipchange_check = os.environ.get('IPCHANGE_CHECK', "60")
 house_address  = os.environ.get('HOUSE_ADDRESS', None)
 crontab        = os.environ.get('CRONTAB', False)
+adaptive       = os.environ.get('IPCHANGE_ADAPTIVE', "false").lower() == "true"
 # ----------------------------------------------------------------------
 
 def banner():
@@ -110,10 +112,10 @@ def initialize():
     global ipchange_check
     global crontab
     global container
-    config_path = os.path.join(os.path.expanduser("~"), ".config/ip-changed")
+    config_path = config.CONFIG_DIR
     if not os.path.exists(config_path):
         os.makedirs(config_path)
-    if os.path.exists(os.path.join(config_path, "config.json")):
+    if os.path.exists(config.CONFIG_FILE):
         result = curate_input("Configuration file already exists. Would you like to reconfigure the script? (y/n) ",
                               ("y", "n"))
         if result != "y":
@@ -141,10 +143,10 @@ def initialize():
         json_data["sender"] = sender_mail_address
 
         if mail_password is None:
-            keyring.set_password("Mail-OutageDetector", json_data["sender"],
+            secret_cache.set_password(secret_cache.MAIL, json_data["sender"],
                                 getpass.getpass("- Type in your password: "))
         else:
-            keyring.set_password("Mail-OutageDetector", json_data["sender"], mail_password)
+            secret_cache.set_password(secret_cache.MAIL, json_data["sender"], mail_password)
         
         if receiver_mail_addresses is None:
             receiver_mail_addresses = None
@@ -164,14 +166,16 @@ def initialize():
             if smtp_server is None:
                 json_data["smtp_server"] = input("- Please enter the SMTP server of your mail provider "
                                                 "(you can look it up online): ")
+            else:
+                json_data["smtp_server"] = smtp_server
             if port_number is None:
                 port_number = ""
                 while not port_number.isdigit():
                     port_number = input("- Type in the port number of the SMTP server: ")
-                json_data["port"] = port_number
+            json_data["port"] = int(port_number)
 
         if mail_password is None:
-            password = keyring.get_password("Mail-OutageDetector", json_data["sender"])
+            password = secret_cache.get_password(secret_cache.MAIL, json_data["sender"])
         else:
             password = mail_password
             break
@@ -203,16 +207,16 @@ def initialize():
             failed_attempts = 0
             while not pushbullet_working:
                 try:
-                    keyring.set_password("PushBullet-OutageDetector", "pushbullet",
+                    secret_cache.set_password(secret_cache.PUSHBULLET, "pushbullet",
                                         getpass.getpass("- Input your PushBullet API key: "))
     
-                    pushbullet_key = keyring.get_password("PushBullet-OutageDetector", "pushbullet")
+                    pushbullet_key = secret_cache.get_password(secret_cache.PUSHBULLET, "pushbullet")
 
                     print("Trying to send a notification through PushBullet!")
                     pushbullet.push_to_bullet("Testing PushBullet Key", "Test is successful!", "", pushbullet_key)
                     pushbullet_working = True
                     print("Notification has been successfully sent, check your phone!")
-                except pushbullet.errors.InvalidKeyError:
+                except pushbullet.InvalidKeyError:
                     failed_attempts += 1
                     if failed_attempts >= 3:
                         print("Too many failed attempts, exiting script, try again later!")
@@ -223,7 +227,7 @@ def initialize():
                     print("No internet, try reconnecting and running the script again!")
                     exit(1)
         else:
-            keyring.set_password("PushBullet-OutageDetector", "pushbullet", notification_password)
+            secret_cache.set_password(secret_cache.PUSHBULLET, "pushbullet", notification_password)
 
     elif notification_type == "ifttt":
         if ifttt_name is None:
@@ -232,10 +236,10 @@ def initialize():
             while not ifttt_working:
                 try:
                     ifttt_name = input("- Input your IFTTT event name: ")
-                    keyring.set_password("IFTTT-OutageDetector", ifttt_name, getpass.getpass("- Input your IFTTT API key: "))
-                    api_key = keyring.get_password("IFTTT-OutageDetector", ifttt_name)
+                    secret_cache.set_password(secret_cache.IFTTT, ifttt_name, getpass.getpass("- Input your IFTTT API key: "))
+                    api_key = secret_cache.get_password(secret_cache.IFTTT, ifttt_name)
                     print("Trying to send a notification through IFTTT!")
-                    iftt.push_to_ifttt(ifttt_name, api_key, "Testing IFTTT")
+                    ifttt.push_to_ifttt(ifttt_name, api_key, "Testing IFTTT")
                     ifttt_work = curate_input("Did you get the notification? (y/n) ", ("y", "n"))
                     if ifttt_work == "y":
                         ifttt_working = True
@@ -250,7 +254,7 @@ def initialize():
                     print("No internet, try reconnecting and running the script again!")
                     exit(1)
         else:
-            keyring.set_password("IFTTT-OutageDetector", ifttt_name, notification_password)
+            secret_cache.set_password(secret_cache.IFTTT, ifttt_name, notification_password)
         json_data["ifttt_event"] = ifttt_name
 
     else:
@@ -263,8 +267,11 @@ def initialize():
     else:
         json_data["house_address"] = house_address.format(notification_type)
 
-    with open(os.path.join(config_path, 'config.json'), 'w+') as json_file:
-        json.dump(json_data, json_file)
+    try:
+        config.save(json_data)
+    except config.ConfigError as error:
+        print(error)
+        exit(1)
 
     if crontab is False:
         crontab_edit = curate_input("- Would you like to setup the script to run automatically "
@@ -275,7 +282,15 @@ def initialize():
     if crontab_edit == "y":
         ipchange_check = get_integer_input()
         exec_path = os.path.join(os.getcwd(), "IP-check.py")
-        cron_scheduling.schedule_job(exec_path, config_path, int(ipchange_check))
+        if adaptive:
+            # Cron starts the script often, the script backs off up to the given interval while the IP is stable
+            # (--min-interval is passed as cron only runs it every whole minute)
+            min_interval = max(1, int(schedule.min_interval))
+            cron_scheduling.schedule_job(exec_path, config_path, min_interval,
+                                         "--adaptive --min-interval {} --interval {}".format(min_interval,
+                                                                                             int(ipchange_check)))
+        else:
+            cron_scheduling.schedule_job(exec_path, config_path, int(ipchange_check))
 
 
 if __name__ == '__main__':
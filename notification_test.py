@@ -32,9 +32,19 @@
 # -------------------------------------------------------------------------------
 
 
+from checker import config
 from notifications import notification
 
 
+try:
+    config.load()
+except FileNotFoundError:
+    print("There is no config file in {}, run the initial configuration first!".format(config.CONFIG_DIR))
+    exit(1)
+except config.ConfigError as error:
+    print(error)
+    exit(1)
+
 notification.sent_notification("", "")
 
 # --------------
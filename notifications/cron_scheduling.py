@@ -32,18 +32,30 @@
 # ------------------------------------------------------------------------------
 
 import os
+import shlex
 import sys
 
 from crontab import CronTab
 
+from checker import config
 
-def schedule_job(script_path, log_path, minute_periodicity=0):
+
+# Installs the crontab entry, replacing the previous ones: running the initial
+# configuration again does not add duplicate jobs. With `arguments` such as
+# "--adaptive --interval 60" cron starts the script every `minute_periodicity`
+# minutes and the script itself skips the runs that are not due. Cron does not
+# inherit the environment, so the job carries the configuration folder.
+def schedule_job(script_path, log_path, minute_periodicity=0, arguments=""):
     interpreter_path = sys.executable
-    command = "{} {} >> {}/ip-changed.log 2>{}/ip-changed.err".format(interpreter_path,
-                                                                      script_path, 
-                                                                      log_path,
-                                                                      log_path)
+    # The script writes and rotates its own JSON-lines log, the .err file only
+    # gets what Python writes on stderr before logging is set up: overwritten by
+    # every run, so it holds the last one and does not grow
+    command = ("IPCHANGE_CONFIG_DIR={} {} {} --log-file {}/ip-changed.log --log-format json{} "
+               "> /dev/null 2>{}/ip-changed.err").format(
+        shlex.quote(config.CONFIG_DIR), interpreter_path, script_path, log_path, " " + arguments if arguments else "",
+        log_path)
     crontab = CronTab(user=True)
+    crontab.remove_all(comment='ipchange_checker')
     cronjob = crontab.new(command=command, comment='ipchange_checker')
     if minute_periodicity != 0 :
         cronjob.minute.every(minute_periodicity)
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+import collections
+import os
+import queue
+import threading
+import time
+
+from checker import log
+from checker import metrics
+
+default_timeout = float(os.environ.get('IPCHANGE_NOTIFY_TIMEOUT', "30"))
+
+ChannelResult = collections.namedtuple("ChannelResult", ["channel", "ok", "latency", "error"])
+
+
+# Sends every channel concurrently, each one in its own daemon thread and with
+# its own deadline, so a failing or hanging channel neither blocks nor delays
+# the others. `channels` maps a channel name to a (send callable, timeout)
+# pair, a None timeout meaning `default_timeout`. Returns one ChannelResult per
+# channel in the given order; a channel still running at its deadline is
+# reported as timed out and left behind.
+def dispatch(channels, timeout=None):
+    results = queue.Queue()
+    start = time.monotonic()
+    deadlines = {}
+
+    def worker(name, send):
+        started = time.monotonic()
+        try:
+            send()
+            results.put(ChannelResult(name, True, time.monotonic() - started, None))
+        except Exception as error:
+            results.put(ChannelResult(name, False, time.monotonic() - started, error))
+
+    for name, (send, channel_timeout) in channels.items():
+        deadlines[name] = start + (channel_timeout or timeout or default_timeout)
+        threading.Thread(target=worker, args=(name, send), daemon=True).start()
+
+    report = {}
+    while len(report) < len(channels):
+        waiting = [name for name in channels if name not in report]
+        next_deadline = min(deadlines[name] for name in waiting)
+        try:
+            result = results.get(timeout=max(0, next_deadline - time.monotonic()))
+            if result.channel not in report:
+                report[result.channel] = result
+        except queue.Empty:
+            now = time.monotonic()
+            for name in waiting:
+                if deadlines[name] <= now:
+                    report[name] = ChannelResult(name, False, now - start,
+                                                 TimeoutError("no answer after {:.1f} seconds".format(
+                                                     deadlines[name] - start)))
+
+    for result in report.values():
+        outcome = "sent" if result.ok else "failed"
+        metrics.notification_latency.observe(result.latency, result.channel, outcome)
+        metrics.notifications.inc(result.channel, outcome)
+    return [report[name] for name in channels]
+
+
+def print_report(report):
+    for result in report:
+        if result.ok:
+            log.info("- {} notification sent in {:.2f} seconds".format(result.channel, result.latency),
+                     channel=result.channel, latency=round(result.latency, 3))
+        else:
+            log.warning("- {} notification failed after {:.2f} seconds: {}".format(result.channel, result.latency,
+                                                                                    result.error),
+                        channel=result.channel, latency=round(result.latency, 3), error=str(result.error))
+
+
+# --------------
+# EndOfFile
+# --------------
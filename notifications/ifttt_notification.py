@@ -31,11 +31,15 @@
 # SOFTWARE.
 # -------------------------------------------------------------------------------
 
-import requests
+from checker import session
 
 
-def push_to_ifttt(ifttt_name, api_key, message_body):
-    requests.post(url = 'https://maker.ifttt.com/trigger/{}/with/key/{}'.format(ifttt_name, api_key), data = {'value1':message_body})
+IFTTT_URL = 'https://maker.ifttt.com/trigger/{}/with/key/{}'
+
+
+def push_to_ifttt(ifttt_name, api_key, message_body, timeout=10):
+    response = session.get_session().post(url = IFTTT_URL.format(ifttt_name, api_key), data = {'value1':message_body}, timeout = timeout)
+    response.raise_for_status()
 
 # --------------
 # EndOfFile
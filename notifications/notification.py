@@ -31,95 +31,110 @@
 # SOFTWARE.
 # ------------------------------------------------------------------------------
 
-import json
-import os
-from pathlib import Path
-import socket
+from checker import config
+from checker import log
+from checker import secret_cache
+from notifications import dispatcher
+from notifications import sendmail as mail
 
-import keyring
 
-from notifications import pushbullet_notification as pushbullet
-from notifications import ifttt_notification as ifttt
-from notifications import sendmail as mail
+def channel_names(cfg):
+    names = ["mail"]
+    if cfg.notification_type in ("pushbullet", "ifttt"):
+        names.append(cfg.notification_type)
+    return names
 
 
-def sent_notification(old_ip, new_ip):
-
-    # Getting configuration
-    config_path = os.path.join(os.path.expanduser("~"), ".config/ip-changed")
-    with open(os.path.join(config_path, "config.json")) as json_file:
-      notification_json = json.load(json_file)
-      notification_type = notification_json["notification_type"]
-
-    if notification_type == "pushbullet":
-        pushbullet_notification = True
-        ifttt_notification = False
-    elif notification_type == "ifttt":
-        pushbullet_notification = False
-        ifttt_notification = True
-    else:
-        pushbullet_notification = False
-        ifttt_notification = False
-
-
-    # Collect Mail data
-    address = ""
-    try:
-        with open(os.path.join(config_path, "config.json")) as json_file:
-            mail_json = json.load(json_file)
-            sender = mail_json["sender"]
-            receivers = mail_json["receivers"]
-            smtp_server = mail_json["smtp_server"]
-            password = keyring.get_password("Mail-OutageDetector", sender)
-            if password is None:
-                print("Mail password not found, try running initial configuration again!")
-                exit(1)
-            address = mail_json["house_address"]
-    except FileNotFoundError:
-        print("Mail will not be sent, there is no config file in the folder.")
-    except KeyError:
-        print("Config.json file doesn't have all fields (sender, receivers, smtp_server, house address")
-
-
-    # Collect additional notification info
-    if pushbullet_notification:
-        push_key = keyring.get_password("PushBullet-OutageDetector", "pushbullet")
-        try:
-            with open(os.path.join(config_path, "config.json")) as json_file:
-                notification_json = json.load(json_file)
-                address = notification_json["house_address"]
-        except FileNotFoundError:
-            print("Configuration file does not exist, try running the initial configuration again!")
-        except KeyError:
-            print("Config.json file doesn't have all fields, try running the initial configuration again!")
-    elif ifttt_notification:
-        try:
-            with open(os.path.join(config_path, "config.json")) as json_file:
-                notification_json = json.load(json_file)
-                ifttt_name = notification_json["ifttt_event"]
-                address = notification_json["house_address"]
-        except FileNotFoundError:
-            print("Configuration file does not exist, try running the initial configuration again!")
-        except KeyError:
-            print("Config.json file doesn't have all fields, try running the initial configuration again!")
-        api_key = keyring.get_password("IFTTT-OutageDetector", ifttt_name)
+def describe(old_ip, new_ip, old_ipv6=None, new_ipv6=None):
+    # One combined line when IPv4 and/or the IPv6 prefix changed
+    changes = []
+    if old_ip != new_ip:
+        changes.append("IP has changed from {} to {}".format(old_ip, new_ip))
+    if new_ipv6 is not None:
+        changes.append("IPv6 has changed from {} to {}".format(old_ipv6, new_ipv6))
+    return ", ".join(changes) or "IP has changed from {} to {}".format(old_ip, new_ip)
+
+
+# One line for a coalesced sequence of changes, e.g. "IP changed 3 times: A -> B -> C -> D"
+def summary(changes):
+    path = [changes[0][0]]
+    path.extend(new_ip for old_ip, new_ip, old_ipv6, new_ipv6 in changes if new_ip != old_ip)
+    return "IP changed {} times: {}".format(len(changes), " -> ".join(str(ip) for ip in path))
 
 
-    #Send Mail
-    print("- Sending mail...")
+# changes: (old_ip, new_ip, old_ipv6, new_ipv6) tuples, oldest first, merged in one message
+def compose(changes, address):
+    old_ip, new_ip, old_ipv6, new_ipv6 = changes[-1]
     subject = "IP changed at {}!".format(address)
-    message_body = "IP has changed from {} to {}".format(old_ip, new_ip)
-    mail.send_mail(sender, receivers, subject, message_body, smtp_server, password)
-
-    if pushbullet_notification:
-        # Send pushbullet
-        print("- Sending pushbullet notification...")
-        pushbullet.push_to_bullet(old_ip, new_ip, address, push_key)
-    elif ifttt_notification:
-        # Send ifttt
-        print("- Sending ifttt notification...")
-        message_body = message_body+" at "+address
-        ifttt.push_to_ifttt(ifttt_name, api_key, message_body)
+    message_body = "\n".join(describe(*change) for change in changes)
+    if len(changes) > 1:
+        message_body = "{}\n{}".format(summary(changes), message_body)
+    title = "IP has changed to {} at {}".format(new_ip if old_ip != new_ip or new_ipv6 is None else new_ipv6,
+                                                address)
+    return subject, title, message_body
+
+
+def build_channels(cfg, subject, title, message_body, only=None):
+    address = cfg.house_address
+    timeouts = cfg.get("notification_timeouts", {})
+    channels = {}
+
+    # Mail
+    if only is None or "mail" in only:
+        password = secret_cache.get_password(secret_cache.MAIL, cfg.sender)
+        if password is None:
+            log.warning("Mail password not found, try running initial configuration again!", channel="mail")
+        else:
+            channels["mail"] = (lambda: mail.send_mail(cfg.sender, cfg.receivers, subject, message_body,
+                                                       cfg.smtp_server, password, cfg.port,
+                                                       timeout=timeouts.get("mail", dispatcher.default_timeout),
+                                                       use_ssl=cfg.get("smtp_ssl", True),
+                                                       allow_plaintext=cfg.get("smtp_allow_plaintext", False)),
+                                timeouts.get("mail"))
+
+    # Additional notification (backends are imported only when configured)
+    if cfg.notification_type == "pushbullet" and (only is None or "pushbullet" in only):
+        from notifications import pushbullet_notification as pushbullet
+        push_key = secret_cache.get_password(secret_cache.PUSHBULLET, "pushbullet")
+        channels["pushbullet"] = (lambda: pushbullet.push_to_bullet("", "", address, push_key,
+                                                                  title, message_body+".",
+                                                                  device=cfg.get("pushbullet_device"),
+                                                                  timeout=timeouts.get("pushbullet",
+                                                                                       dispatcher.default_timeout)),
+                                  timeouts.get("pushbullet"))
+    elif cfg.notification_type == "ifttt" and (only is None or "ifttt" in only):
+        from notifications import ifttt_notification as ifttt
+        api_key = secret_cache.get_password(secret_cache.IFTTT, cfg.ifttt_event)
+        channels["ifttt"] = (lambda: ifttt.push_to_ifttt(cfg.ifttt_event, api_key, message_body+" at "+address,
+                                                         timeout=timeouts.get("ifttt", dispatcher.default_timeout)),
+                             timeouts.get("ifttt"))
+    return channels
+
+
+def sent_notification(old_ip, new_ip, cfg=None, old_ipv6=None, new_ipv6=None):
+
+    # Getting configuration (fleet targets pass their own)
+    if cfg is None:
+        try:
+            cfg = config.load()
+        except FileNotFoundError:
+            log.warning("Notification will not be sent, there is no config file in {}.".format(config.CONFIG_DIR))
+            return
+        except config.ConfigError as error:
+            log.warning(str(error))
+            return
+
+    subject, title, message_body = compose([(old_ip, new_ip, old_ipv6, new_ipv6)], cfg.house_address)
+    channels = build_channels(cfg, subject, title, message_body)
+
+    # Send all channels concurrently
+    if not channels:
+        log.warning("- No notification channel available, nothing sent")
+        return []
+    log.info("- Sending {} notification...".format(", ".join(channels)), channels=list(channels))
+    report = dispatcher.dispatch(channels)
+    dispatcher.print_report(report)
+    return report
 
 if __name__ == '__main__':
     sent_notification("", "")
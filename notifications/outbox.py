@@ -0,0 +1,360 @@
+#!/usr/bin/python3
+
+# -------------------------------------------------------------------------------
+# Author: Ruggero Citton
+# Date: September 18 , 2023
+# Purpose: Send a notification in case of public IP change
+# Tested on: Ubuntu 23.04 - Raspberry PI 4
+#
+#
+# Licensed under The MIT License (MIT).
+# See included LICENSE file or the notice below.
+#
+# Copyright (c) 2023 Ruggero Cittons
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------------
+
+# Durable notification outbox (outbox.db next to config.json). A detected change
+# is stored once per notification channel before ip.log is updated; drain()
+# delivers the due messages, each channel batching its pending changes in one
+# message, and reschedules the failed ones with exponential backoff. A change
+# repeating the last pending one of its (site, channel) is stored once, and rows
+# are leased while being delivered so concurrent drains do not send them twice:
+# delivery is at-least-once.
+#
+# Flapping addresses are debounced: with a coalescing window, the changes of a
+# channel queued within the window after the first one are sent as a single
+# summary, and not at all when the address ends where it started (A -> B -> A)
+# and no later change of the channel is left out of the batch.
+# Each (site, channel) also has a token bucket, persisted in the outbox, so an
+# address flipping for hours still costs at most `rate_burst` messages plus
+# `rate_per_hour` per hour; the rows waiting for a token are merged with the
+# later ones.
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from checker import config
+from checker import log
+
+
+OUTBOX_FILE = os.path.join(config.CONFIG_DIR, "outbox.db")
+
+retry_base   = float(os.environ.get('IPCHANGE_OUTBOX_RETRY', "30"))
+retry_max    = float(os.environ.get('IPCHANGE_OUTBOX_RETRY_MAX', "3600"))
+batch_size   = int(os.environ.get('IPCHANGE_OUTBOX_BATCH', "20"))
+coalesce_window = float(os.environ.get('IPCHANGE_COALESCE_WINDOW', "0"))
+rate_burst   = float(os.environ.get('IPCHANGE_RATE_BURST', "5"))
+rate_per_hour = float(os.environ.get('IPCHANGE_RATE_PER_HOUR', "12"))
+lease        = 120
+keep_days    = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id           INTEGER PRIMARY KEY,
+    created      REAL    NOT NULL,
+    site         TEXT    NOT NULL DEFAULT '',
+    channel      TEXT    NOT NULL,
+    old_ip       TEXT,
+    new_ip       TEXT,
+    old_ipv6     TEXT,
+    new_ipv6     TEXT,
+    dedup_key    TEXT    NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL    NOT NULL,
+    delivered    REAL,
+    last_error   TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS outbox_pending_key ON outbox (dedup_key) WHERE delivered IS NULL;
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (delivered, next_attempt);
+CREATE INDEX IF NOT EXISTS outbox_channel ON outbox (site, channel, id);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name    TEXT PRIMARY KEY,
+    tokens  REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def backoff(attempts):
+    return min(retry_max, retry_base * 2 ** max(attempts - 1, 0)) * random.uniform(0.8, 1.2)
+
+
+class Outbox:
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    # With a coalescing window a change joins the pending ones of its channel
+    # (same due time), or opens a new window. The dedup key chains the change to
+    # the last pending row of the channel, so a repeated change (A -> B after
+    # A -> B -> A) is queued again while a retried enqueue is not
+    def enqueue(self, channels, old_ip, new_ip, old_ipv6=None, new_ipv6=None, site="", window=None):
+        now = time.time()
+        window = coalesce_window if window is None else window
+        queued = 0
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for channel in channels:
+                    due = now
+                    if window > 0:
+                        pending = self.db.execute(
+                            "SELECT MIN(next_attempt) FROM outbox WHERE delivered IS NULL AND site = ? "
+                            "AND channel = ?", (site, channel)).fetchone()[0]
+                        due = now + window if pending is None else max(now, pending)
+                    last = self.db.execute(
+                        "SELECT id, old_ip, new_ip, old_ipv6, new_ipv6 FROM outbox WHERE delivered IS NULL "
+                        "AND site = ? AND channel = ? ORDER BY id DESC LIMIT 1", (site, channel)).fetchone()
+                    if last is not None and last[1:] == (old_ip, new_ip, old_ipv6, new_ipv6):
+                        continue
+                    previous = None if last is None else last[0]
+                    key = "|".join(str(value) for value in (site, channel, previous, old_ip, new_ip, old_ipv6,
+                                                            new_ipv6))
+                    queued += self.db.execute(
+                        "INSERT OR IGNORE INTO outbox (created, site, channel, old_ip, new_ip, old_ipv6, new_ipv6, "
+                        "dedup_key, next_attempt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (now, site, channel, old_ip, new_ip, old_ipv6, new_ipv6, key, due)).rowcount
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return queued
+
+    # Leases the due messages, grouped per (site, channel), oldest first
+    def claim(self, now=None):
+        now = now or time.time()
+        groups = {}
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.db.execute(
+                    "SELECT id, site, channel, old_ip, new_ip, old_ipv6, new_ipv6, attempts FROM outbox "
+                    "WHERE delivered IS NULL AND next_attempt <= ? ORDER BY created, id", (now,)).fetchall()
+                for row in rows:
+                    group = groups.setdefault((row[1], row[2]), [])
+                    if len(group) < batch_size:
+                        group.append(row)
+                claimed = [row[0] for group in groups.values() for row in group]
+                self.db.executemany("UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                                    [(now + lease, row_id) for row_id in claimed])
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return groups
+
+    def delivered(self, ids, note=None):
+        with self._lock:
+            self.db.executemany("UPDATE outbox SET delivered = ?, last_error = ? WHERE id = ?",
+                                [(time.time(), note, row_id) for row_id in ids])
+
+    def failed(self, rows, error):
+        now = time.time()
+        with self._lock:
+            self.db.executemany("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                                [(row[7] + 1, now + backoff(row[7] + 1), str(error), row[0]) for row in rows])
+
+    # Reschedules rows without counting an attempt (waiting for a rate limit token)
+    def defer(self, rows, until, note):
+        with self._lock:
+            self.db.executemany("UPDATE outbox SET next_attempt = ?, last_error = ? WHERE id = ?",
+                                [(until, note, row[0]) for row in rows])
+
+    # Token bucket of a (site, channel): returns 0 when a token was taken,
+    # otherwise the seconds before the next one
+    def take_token(self, name, burst=None, per_hour=None, now=None):
+        burst = rate_burst if burst is None else burst
+        per_hour = rate_per_hour if per_hour is None else per_hour
+        if per_hour <= 0:
+            return 0
+        now = now or time.time()
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT tokens, updated FROM rate_limits WHERE name = ?", (name,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * per_hour / 3600)
+                wait = 0 if tokens >= 1 else (1 - tokens) * 3600 / per_hour
+                if not wait:
+                    tokens -= 1
+                self.db.execute("INSERT OR REPLACE INTO rate_limits (name, tokens, updated) VALUES (?, ?, ?)",
+                                (name, tokens, now))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return wait
+
+    # Id of the last change queued for a (site, channel), delivered or not
+    def latest(self, site, channel):
+        with self._lock:
+            return self.db.execute("SELECT MAX(id) FROM outbox WHERE site = ? AND channel = ?",
+                                   (site, channel)).fetchone()[0]
+
+    def next_due(self):
+        with self._lock:
+            return self.db.execute("SELECT MIN(next_attempt) FROM outbox WHERE delivered IS NULL").fetchone()[0]
+
+    def purge(self, days=keep_days):
+        with self._lock:
+            return self.db.execute("DELETE FROM outbox WHERE delivered IS NOT NULL AND delivered < ?",
+                                   (time.time() - days * 86400,)).rowcount
+
+
+def has_pending(path=OUTBOX_FILE):
+    if not os.path.exists(path):
+        return False
+    box = Outbox(path)
+    try:
+        next_due = box.next_due()
+        return next_due is not None and next_due <= time.time()
+    finally:
+        box.close()
+
+
+def default_config(site):
+    return config.load()
+
+
+# True when a coalesced sequence of changes ends on the addresses it started from
+def flapped_back(rows):
+    if len(rows) < 2 or rows[0][3] != rows[-1][4]:
+        return False
+    old_ipv6 = [row[5] for row in rows if row[6] is not None]
+    new_ipv6 = [row[6] for row in rows if row[6] is not None]
+    return not new_ipv6 or old_ipv6[0] == new_ipv6[-1]
+
+
+# Delivers the due messages, every (site, channel) batch concurrently through
+# the dispatcher. `cfg_for(site)` returns the Config of a site (fleet targets).
+def drain(cfg_for=default_config, path=OUTBOX_FILE, box=None):
+    from notifications import dispatcher
+    from notifications import notification
+
+    own_box = box is None
+    box = box or Outbox(path)
+    try:
+        groups = box.claim()
+        if not groups:
+            return []
+        channels = {}
+        batches = {}
+        for (site, channel), rows in groups.items():
+            name = "{}/{}".format(site, channel) if site else channel
+            try:
+                cfg = cfg_for(site)
+            except Exception as error:
+                box.failed(rows, error)
+                continue
+            if channel not in notification.channel_names(cfg):
+                box.delivered([row[0] for row in rows], "channel no longer configured")
+                continue
+            if flapped_back(rows) and rows[-1][0] == box.latest(site, channel):
+                log.info("- {} notification suppressed, IP changed {} times back to {}".format(name, len(rows),
+                                                                                              rows[0][3]),
+                         channel=name, changes=len(rows))
+                box.delivered([row[0] for row in rows], "flapped back")
+                continue
+            changes = [row[3:7] for row in rows]
+            subject, title, message_body = notification.compose(changes, cfg.house_address)
+            built = notification.build_channels(cfg, subject, title, message_body, only=(channel,))
+            if channel not in built:
+                box.failed(rows, "channel not available")
+                continue
+            per_hour = cfg.get("notification_rate_limits", {}).get(channel)
+            wait = box.take_token(name, per_hour=per_hour)
+            if wait:
+                log.warning("- {} notification rate limited, next one in {:.0f} seconds".format(name, wait),
+                            channel=name, wait=round(wait))
+                box.defer(rows, time.time() + wait, "rate limited")
+                continue
+            channels[name] = built[channel]
+            batches[name] = rows
+
+        if not channels:
+            return []
+        log.info("- Sending {} notification...".format(", ".join(channels)), channels=list(channels))
+        report = dispatcher.dispatch(channels)
+        dispatcher.print_report(report)
+        for result in report:
+            rows = batches[result.channel]
+            if result.ok:
+                box.delivered([row[0] for row in rows])
+            else:
+                box.failed(rows, result.error)
+        box.purge()
+        return report
+    finally:
+        if own_box:
+            box.close()
+
+
+# Drains the outbox in the background (daemon mode): immediately when woken up
+# after an enqueue, then whenever a retry is due.
+class OutboxWorker:
+
+    def __init__(self, cfg_for=default_config, path=OUTBOX_FILE):
+        self.cfg_for = cfg_for
+        self.path = path
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self):
+        box = Outbox(self.path)
+        while not self._stop.is_set():
+            try:
+                drain(self.cfg_for, box=box)
+                next_due = box.next_due()
+            except Exception as error:
+                log.error("- Notification outbox drain failed: {}".format(error), error=str(error))
+                next_due = None
+            delay = 60 if next_due is None else min(60, max(0.1, next_due - time.time()))
+            self._wake.wait(delay)
+            self._wake.clear()
+        box.close()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+
+# --------------
+# EndOfFile
+# --------------
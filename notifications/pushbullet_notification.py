@@ -31,18 +31,64 @@
 # SOFTWARE.
 # -------------------------------------------------------------------------------
 
-from pushbullet import PushBullet, errors
-import sys
 import os
+import threading
+import time
 
+from checker import session
 
-def push_to_bullet(old_ip, new_ip, address, api_key):
+#Pushes are posted straight to the REST API over the shared session: one request
+#per notification, instead of the pushbullet.py client bootstrap (user, devices,
+#chats and channels) and its python-magic dependency
+API_URL     = "https://api.pushbullet.com/v2"
+PUSHES_URL  = API_URL + "/pushes"
+DEVICES_URL = API_URL + "/devices"
 
-  pb = PushBullet(api_key)
-  title = "IP has changed to "+new_ip+" at "+address
-  message_body = "The IP changed from "+old_ip+" to "+new_ip+"."
+default_timeout = 10
+device_ttl = float(os.environ.get('IPCHANGE_PUSHBULLET_DEVICE_TTL', "86400"))
 
-  pb.push_note(title, message_body)
+#Device lists per API key, (expiry, {nickname: iden}), only used to push to one device
+devices_cache = {}
+devices_lock = threading.Lock()
+
+class InvalidKeyError(Exception):
+  pass
+
+def request(method, url, api_key, timeout=None, **kwargs):
+  response = session.get_session().request(method, url, headers = {"Access-Token": api_key},
+                                           timeout = timeout or default_timeout, **kwargs)
+  if response.status_code in (401, 403):
+    raise InvalidKeyError("PushBullet rejected the API key ({})".format(response.status_code))
+  response.raise_for_status()
+  return response.json()
+
+def get_devices(api_key, timeout=None):
+  with devices_lock:
+    cached = devices_cache.get(api_key)
+    if cached is not None and cached[0] > time.monotonic():
+      return cached[1]
+  answer = request("GET", DEVICES_URL, api_key, timeout, params = {"active": "true"})
+  devices = {device.get("nickname"): device["iden"] for device in answer.get("devices", [])
+             if device.get("active") and device.get("pushable")}
+  with devices_lock:
+    devices_cache[api_key] = (time.monotonic() + device_ttl, devices)
+  return devices
+
+def push_to_bullet(old_ip, new_ip, address, api_key, title=None, message_body=None, device=None, timeout=None):
+
+  if title is None:
+    title = "IP has changed to "+new_ip+" at "+address
+  if message_body is None:
+    message_body = "The IP changed from "+old_ip+" to "+new_ip+"."
+
+  note = {"type": "note", "title": title, "body": message_body}
+  #All the devices by default; a device nickname is resolved with the cached device list
+  if device:
+    devices = get_devices(api_key, timeout)
+    if device not in devices:
+      raise ValueError("PushBullet device '{}' not found (devices: {})".format(device, ", ".join(map(str, devices))))
+    note["device_iden"] = devices[device]
+  return request("POST", PUSHES_URL, api_key, timeout, json = note)
 
 
 # --------------
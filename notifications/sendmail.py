@@ -31,15 +31,20 @@
 # SOFTWARE.
 # -------------------------------------------------------------------------------
 
+import atexit
 import email, ssl
-from smtplib import SMTP_SSL, SMTPAuthenticationError
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
+from smtplib import SMTP, SMTP_SSL, SMTPAuthenticationError, SMTPException, SMTPServerDisconnected
 from email.mime.text import MIMEText
 import re
 
 
+max_session_age      = 300
+max_session_messages = 100
+keepalive_interval   = 60
+
+
 def check_mails(mails):
     regex = '^\w+([\.-]?\w+)*@\w+([\.-]?\w+)*(\.\w{2,3})+$'
     mail_list = mails.split(',')
@@ -55,24 +60,147 @@ def check_mails(mails):
     return mail_addresses_string
 
 
-def send_mail(sender, receivers, subject, body, smtp_server, password, port=465):
-    # Create a multipart message and set headers
-    message = MIMEMultipart()
+def build_message(sender, receivers, subject, body):
+    message = MIMEText(body, "plain")
     message["From"] = sender
     message["To"] = receivers
     message["Subject"] = subject
     message["Bcc"] = receivers  # Recommended for mass emails
+    return message.as_string()
+
+
+# The SSL context is expensive to build (it loads the CA bundle), build it once
+_context = None
+
+def get_context():
+    global _context
+    if _context is None:
+        _context = ssl.create_default_context()
+    return _context
+
+
+# Authenticated SMTP session reused across messages. The session is replaced
+# once it is older than `max_age` seconds or carried `max_messages` messages;
+# after `keepalive` idle seconds it is checked with a NOOP first, and a message
+# failing on a dropped session is retried once on a new one.
+# Without SSL the session must be upgraded with STARTTLS before the login: a
+# server (or a middlebox stripping it) not offering STARTTLS is refused unless
+# `allow_plaintext` is set.
+class SMTPClient:
+
+    def __init__(self, smtp_server, port, sender, password, timeout=30, use_ssl=True,
+                 max_age=None, max_messages=None, keepalive=None, allow_plaintext=False):
+        self.smtp_server = smtp_server
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.timeout = timeout
+        self.use_ssl = use_ssl
+        self.allow_plaintext = allow_plaintext
+        self.max_age = max_age or max_session_age
+        self.max_messages = max_messages or max_session_messages
+        self.keepalive = keepalive or keepalive_interval
+        self.server = None
+        self.connected_at = 0
+        self.used_at = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self.use_ssl:
+            server = SMTP_SSL(self.smtp_server, self.port, context=get_context(), timeout=self.timeout)
+        else:
+            server = SMTP(self.smtp_server, self.port, timeout=self.timeout)
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls(context=get_context())
+                server.ehlo()
+            elif not self.allow_plaintext:
+                server.close()
+                raise SMTPException("{} does not offer STARTTLS, refusing to send the password in clear text "
+                                    "(set \"smtp_allow_plaintext\": true to allow it)".format(self.smtp_server))
+        try:
+            if self.password:
+                server.login(self.sender, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.connected_at = self.used_at = time.monotonic()
+        self.messages = 0
+
+    def disconnect(self):
+        server, self.server = self.server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (SMTPException, OSError):
+            server.close()
+
+    def alive(self):
+        if self.server is None:
+            return False
+        now = time.monotonic()
+        if now - self.connected_at >= self.max_age or self.messages >= self.max_messages:
+            return False
+        if now - self.used_at >= self.keepalive:
+            try:
+                return self.server.noop()[0] == 250
+            except (SMTPException, OSError):
+                return False
+        return True
+
+    def send(self, receivers, text):
+        with self._lock:
+            for attempt in (1, 2):
+                if not self.alive():
+                    self.disconnect()
+                    self.connect()
+                try:
+                    self.server.sendmail(self.sender, receivers.split(','), text)
+                    self.messages += 1
+                    self.used_at = time.monotonic()
+                    return
+                except (SMTPServerDisconnected, ConnectionError):
+                    self.disconnect()
+                    if attempt == 2:
+                        raise
+
+    def close(self):
+        with self._lock:
+            self.disconnect()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(sender, smtp_server, password, port=465, timeout=30, use_ssl=True, allow_plaintext=False):
+    key = (smtp_server, int(port), sender, use_ssl, allow_plaintext)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or client.password != password:
+            if client is not None:
+                client.close()
+            client = SMTPClient(smtp_server, int(port), sender, password, timeout, use_ssl,
+                                allow_plaintext=allow_plaintext)
+            _clients[key] = client
+        client.timeout = timeout
+        return client
 
-    # Add body to email
-    message.attach(MIMEText(body, "plain"))
+@atexit.register
+def close_all():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
 
-    text = message.as_string()
 
-    # Log in to server using secure context and send email
-    context = ssl.create_default_context()
-    with SMTP_SSL(smtp_server, port, context=context) as server:
-        server.login(sender, password)
-        server.sendmail(sender, receivers.split(','), text)
+def send_mail(sender, receivers, subject, body, smtp_server, password, port=465, timeout=30, use_ssl=True,
+              allow_plaintext=False):
+    # Single envelope for all the receivers, over the pooled session
+    text = build_message(sender, receivers, subject, body)
+    get_client(sender, smtp_server, password, port, timeout, use_ssl, allow_plaintext).send(receivers, text)
 
 # --------------
 # EndOfFile
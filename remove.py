@@ -36,6 +36,8 @@ import sys
 
 from crontab import CronTab
 
+from checker import config
+
 def uninstall():
     cron = CronTab(user=True)
     comment = "ipchange_checker"
@@ -43,6 +45,8 @@ def uninstall():
     cron.remove(cron_job)
     cron.write()
     print ("Uninstalled ipchange_checker")
+    if os.path.exists(config.CONFIG_DIR):
+        print ("Configuration and IP log are kept in {}, remove it to clean up completely".format(config.CONFIG_DIR))
 
 
 uninstall()